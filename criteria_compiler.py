@@ -0,0 +1,916 @@
+"""Provides a class for compiling award criteria into SQL.
+
+Provides the class `CriteriaCompiler` for validating an `AwardCriteriaRecord`
+against the columns of the students table and turning it into a parameterized
+SQL query. Compiled queries are memoized on a canonical hash of the criteria,
+sort and limit, so an unchanged scholarship is only compiled once.
+
+Criteria map fields to a value, matched for equality, or to an object of
+operators: `$eq`, `$ne`, `$gt`, `$gte`, `$lt`, `$lte`, `$in`, `$nin`,
+`$between` (a [low, high] list), `$like` (a SQL LIKE pattern), `$regex`
+(a Python regular expression), `$exists` (true or false) and `$not` (an
+object of operators). Criteria can be combined with `$and` and `$or`, each a
+list of criteria, and negated with `$not`, at any depth.
+"""
+
+import functools
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from award_criteria_record import AwardCriteriaRecord
+from statement_cache import StatementCache
+from pypika import Query, Table, Field, Order, Parameter, Case, analytics as an
+from pypika.terms import Criterion, Term, ValueWrapper
+
+
+# Maps ASCII uppercase letters to lowercase, like SQLite's NOCASE collation
+_ASCII_LOWERCASE: dict[int, int] = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+class InvalidCriteriaError(Exception):
+    """Class for defining the "InvalidCriteria" exception."""
+
+    pass
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_regex(pattern: str) -> re.Pattern:
+    """Returns the compiled regular expression, memoized."""
+    return re.compile(pattern)
+
+
+def regexp(pattern: str | None, value: Any) -> bool | None:
+    """Implements SQLite's `value REGEXP pattern` operator.
+
+    Registered on every connection as a deterministic function, so SQLite
+    may evaluate it once per distinct value.
+
+    Args:
+        pattern (str | None): Python regular expression.
+        value (Any): Value of the column.
+    Returns:
+        Whether the pattern matches anywhere in the value, or None if either is NULL.
+    """
+    if pattern is None or value is None:
+        return None
+
+    return _compile_regex(pattern).search(str(value)) is not None
+
+
+class CriteriaCompiler:
+    """Compiles award criteria into parameterized SQL.
+
+    Class for validating award criteria and compiling it into a SQL template
+    with `?` placeholders plus the tuple of values bound to them. `$not` is
+    pushed down to the conditions it negates, so `{"$not": {"cum_gpa":
+    {"$gte": 3}}}` becomes `cum_gpa < ?`, which can still use an index.
+    """
+
+    operators: dict[str, Callable[[Field, list[Parameter]], Criterion]] = {
+        "$in": lambda field, params: field.isin(params),
+        "$nin": lambda field, params: field.notin(params),
+        "$gte": lambda field, params: field >= params[0],
+        "$gt": lambda field, params: field > params[0],
+        "$lte": lambda field, params: field <= params[0],
+        "$lt": lambda field, params: field < params[0],
+        "$eq": lambda field, params: field == params[0],
+        "$ne": lambda field, params: field != params[0],
+        "$between": lambda field, params: field.between(params[0], params[1]),
+        "$like": lambda field, params: field.like(params[0]),
+        "$regex": lambda field, params: field.regexp(params[0]),
+        "$exists": lambda field, params: field.notnull(),
+        # Only produced by negating the operators above
+        "$nbetween": lambda field, params: ~field.between(params[0], params[1]),
+        "$nlike": lambda field, params: field.not_like(params[0]),
+        "$nregex": lambda field, params: ~field.regexp(params[0]),
+        "$nexists": lambda field, params: field.isnull(),
+    }
+    negations: dict[str, str] = {
+        "$in": "$nin",
+        "$nin": "$in",
+        "$gte": "$lt",
+        "$gt": "$lte",
+        "$lte": "$gt",
+        "$lt": "$gte",
+        "$eq": "$ne",
+        "$ne": "$eq",
+        "$between": "$nbetween",
+        "$nbetween": "$between",
+        "$like": "$nlike",
+        "$nlike": "$like",
+        "$regex": "$nregex",
+        "$nregex": "$regex",
+        "$exists": "$nexists",
+        "$nexists": "$exists",
+    }
+    field_operators: set[str] = {
+        "$in",
+        "$nin",
+        "$gte",
+        "$gt",
+        "$lte",
+        "$lt",
+        "$eq",
+        "$ne",
+        "$between",
+        "$like",
+        "$regex",
+        "$exists",
+        "$not",
+    }
+    list_operators: set[str] = {"$in", "$nin"}
+    logical_operators: set[str] = {"$and", "$or", "$not"}
+
+    def __init__(
+        self, columns: list[str], statements: StatementCache, max_size: int = 256
+    ) -> None:
+        """Creates an instance of CriteriaCompiler.
+
+        Args:
+            columns (list[str]): Names of the columns of the students table.
+            statements (StatementCache): Cache for the rendered SQL templates.
+            max_size (int, optional): Maximum number of compiled queries kept. Defaults to 256.
+        """
+        self.columns: set[str] = set(columns)
+        self.statements: StatementCache = statements
+        self.max_size: int = max_size
+        self.__compiled: OrderedDict[Hashable, tuple[str, tuple]] = OrderedDict()
+        # Award names, as NOCASE compares them, to the keys of their compiled
+        # queries and back, pruned along with the compiled queries
+        self.__keys_by_name: dict[str, set[Hashable]] = {}
+        self.__names_by_key: dict[Hashable, set[str]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(record: AwardCriteriaRecord) -> str:
+        """Returns the canonical hash of an award's criteria.
+
+        Returns a hash of the criteria, sort and limit of `record` that does
+        not depend on the order of the keys in the criteria.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            The hash as a hexadecimal `str`.
+        """
+        canonical: str = json.dumps(
+            {"criteria": record.criteria, "sort": record.sort, "limit": record.limit},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def compile(self, table_name: str, record: AwardCriteriaRecord) -> tuple[str, tuple]:
+        """Compiles award criteria into a query on a students table.
+
+        Returns the memoized query for `record` if it has been compiled before,
+        otherwise validates and compiles it.
+
+        Args:
+            table_name (str): Name of the students table.
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A tuple of the SQL template and the values for its placeholders.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        key: tuple[str, str] = (table_name, self.fingerprint(record))
+
+        with self.__lock:
+            compiled: tuple[str, tuple] | None = self.__compiled.get(key)
+
+            if compiled is not None:
+                self.__compiled.move_to_end(key)
+                self._link(record.name, key)
+                return compiled
+
+        compiled = self._compile(table_name, record)
+
+        with self.__lock:
+            self.__compiled[key] = compiled
+            self._link(record.name, key)
+
+            # Evict least recently used queries
+            while len(self.__compiled) > self.max_size:
+                self._forget(next(iter(self.__compiled)))
+
+        return compiled
+
+    def compile_page(
+        self, table_name: str, record: AwardCriteriaRecord, after: tuple | None
+    ) -> tuple[list[tuple[str, tuple]], tuple[str, ...]]:
+        """Compiles award criteria into keyset pagination queries.
+
+        The queries order by the award's sort columns with `student_ID` as the
+        tiebreaker, and only return rows that come after the key `after`. The
+        leading sort column is bounded with a plain range, so SQLite seeks to
+        the key in an index and the cost of a page does not depend on how deep
+        it is. Since SQLite sorts NULLs first when ascending and last when
+        descending, rows whose leading column is NULL are a separate segment,
+        returned by a second query once the first one runs out.
+
+        Args:
+            table_name (str): Name of the students table.
+            record (AwardCriteriaRecord): Scholarship criteria.
+            after (tuple | None): Key of the last row of the previous page, or `None` for the first page.
+        Returns:
+            A tuple of the queries to run in order, each a SQL template ending in
+            `LIMIT ?` and the values for its other placeholders, and the key fields.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        conditions, params = self._conditions(record)
+        sort: tuple[tuple[str, Order], ...] = self._sort(record)
+
+        # student_ID is unique, so it makes the order total
+        if "student_ID" not in (field for field, _ in sort):
+            sort += (("student_ID", Order.asc),)
+
+        key_fields: tuple[str, ...] = tuple(field for field, _ in sort)
+
+        if after is None:
+            segments: list[str] = ["all"]
+        elif len(after) != len(sort):
+            raise InvalidCriteriaError(
+                f"{record.name}: page key must have {len(sort)} values."
+            )
+        else:
+            segments = self._segments(sort, after)
+
+        queries: list[tuple[str, tuple]] = []
+
+        for segment in segments:
+            nulls: tuple[bool, ...] | None = (
+                None if after is None else tuple(value is None for value in after)
+            )
+            segment_params: list = list(params)
+
+            if segment == "after":
+                segment_params.extend(self._keyset_params(sort, after))
+
+            def build(segment: str = segment, nulls: tuple | None = nulls) -> str:
+                query: Query = Query.from_(Table(table_name)).select("*")
+
+                query = query.where(self._criterion(conditions))
+
+                lead: Field = Field(sort[0][0])
+
+                if segment == "after":
+                    query = query.where(self._keyset_predicate(sort, nulls))
+                elif segment == "null":
+                    query = query.where(lead.isnull())
+                elif segment == "not_null":
+                    query = query.where(lead.notnull())
+
+                for field, order in sort:
+                    query = query.orderby(field, order=order)
+
+                return str(query.limit(Parameter("?")))
+
+            sql: str = self.statements.get(
+                (
+                    "page_students_by_criteria",
+                    table_name,
+                    conditions,
+                    sort,
+                    segment,
+                    nulls if segment == "after" else None,
+                ),
+                build,
+            )
+            queries.append((sql, tuple(segment_params)))
+
+        return queries, key_fields
+
+    def compile_evaluation(
+        self, table_name: str, records: list[AwardCriteriaRecord]
+    ) -> tuple[str, tuple, list[tuple[tuple[tuple[str, Order], ...], int]]]:
+        """Compiles several awards into a single scan of a students table.
+
+        The query selects every column of every student, followed by one column
+        per award that is 1 when the student matches that award's criteria and
+        0 otherwise, so all awards are evaluated in one pass.
+
+        Args:
+            table_name (str): Name of the students table.
+            records (list[AwardCriteriaRecord]): Scholarship criteria.
+        Returns:
+            A tuple of the SQL template, the values for its placeholders and
+            the (sort, limit) of every award, in the order of `records`.
+        Raises:
+            InvalidCriteriaError: If any criteria uses unknown fields or operators.
+        """
+        shapes: list[tuple[tuple, ...]] = []
+        params: list = []
+        orderings: list[tuple[tuple[tuple[str, Order], ...], int]] = []
+
+        for record in records:
+            conditions, values = self._conditions(record)
+            shapes.append(conditions)
+            params.extend(values)
+            orderings.append((self._sort(record), self._limit(record)))
+
+        def build() -> str:
+            flags: list[Term] = [
+                # An award without criteria matches every student
+                Case().when(self._criterion(conditions), 1).else_(0)
+                if conditions
+                else ValueWrapper(1)
+                for conditions in shapes
+            ]
+
+            return str(Query.from_(Table(table_name)).select("*", *flags))
+
+        sql: str = self.statements.get(
+            ("evaluate_awards", table_name, tuple(shapes)), build
+        )
+
+        return sql, tuple(params), orderings
+
+    def compile_top_by_group(
+        self, table_name: str, record: AwardCriteriaRecord, partition_by: tuple[str, ...]
+    ) -> tuple[str, tuple]:
+        """Compiles award criteria into a top-N per group query.
+
+        Numbers the students matching the criteria within every group of
+        `partition_by` with `ROW_NUMBER()`, in the award's sort order with
+        `student_ID` breaking ties, and keeps the first `limit` of each group.
+        Every row is followed by its rank in its group, and rows are ordered by
+        group, then rank.
+
+        Args:
+            table_name (str): Name of the students table.
+            record (AwardCriteriaRecord): Scholarship criteria, whose limit applies to each group.
+            partition_by (tuple[str, ...]): Fields whose values form the groups.
+        Returns:
+            A tuple of the SQL template and the values for its placeholders.
+        Raises:
+            InvalidCriteriaError: If the criteria or partition uses unknown fields or operators.
+        """
+        conditions, params = self._conditions(record)
+        sort: tuple[tuple[str, Order], ...] = self._sort(record)
+        limit: int = self._limit(record)
+
+        for field in partition_by:
+            self._check_field(record, field)
+
+        # Rows that tie on the sort are ranked by student_ID
+        if "student_ID" not in (field for field, _ in sort):
+            sort += (("student_ID", Order.asc),)
+
+        # If limit is specified, and not 0, keep that many rows per group
+        if limit:
+            params.append(limit)
+
+        def build() -> str:
+            rank: an.RowNumber = an.RowNumber().over(
+                *(Field(field) for field in partition_by)
+            )
+
+            for field, order in sort:
+                rank = rank.orderby(Field(field), order=order)
+
+            ranked: Query = (
+                Query.from_(Table(table_name))
+                .select("*", rank.as_("group_rank"))
+                .where(self._criterion(conditions))
+            )
+            query: Query = Query.from_(ranked).select("*")
+
+            if limit:
+                query = query.where(ranked.group_rank <= Parameter("?"))
+
+            for field in partition_by:
+                query = query.orderby(ranked.field(field))
+
+            return str(query.orderby(ranked.group_rank))
+
+        sql: str = self.statements.get(
+            (
+                "select_top_students_by_group",
+                table_name,
+                conditions,
+                sort,
+                tuple(partition_by),
+                bool(limit),
+            ),
+            build,
+        )
+
+        return sql, tuple(params)
+
+    def _criterion(self, conditions: tuple[tuple, ...]) -> Criterion:
+        """Returns the where clause for the shape of some conditions.
+
+        Args:
+            conditions (tuple[tuple, ...]): (field, operator, number of values)
+                conditions and ("$and" or "$or", conditions) groups.
+        Returns:
+            The conditions ANDed together as a pypika `Criterion`.
+        """
+        return Criterion.all([self._term(condition) for condition in conditions])
+
+    def _term(self, condition: tuple) -> Criterion:
+        """Returns the pypika `Criterion` for the shape of a condition or group.
+
+        Args:
+            condition (tuple): A (field, operator, number of values) condition
+                or an ("$and" or "$or", conditions) group.
+        Returns:
+            The condition as a pypika `Criterion`.
+        """
+        # If it is a group, join its conditions
+        if len(condition) == 2:
+            junction, conditions = condition
+            terms: list[Criterion] = [self._term(item) for item in conditions]
+            return Criterion.all(terms) if junction == "$and" else Criterion.any(terms)
+
+        field, key, arity = condition
+        return self.operators[key](Field(field), [Parameter("?")] * arity)
+
+    @classmethod
+    def _segments(cls, sort: tuple[tuple[str, Order], ...], after: tuple) -> list[str]:
+        """Returns the segments of rows that come after a key.
+
+        Args:
+            sort (tuple[tuple[str, Order], ...]): Key fields and their order.
+            after (tuple): Key of the last row of the previous page.
+        Returns:
+            A list of "after" (rest of the key's segment), "null" (rows whose
+            leading column is NULL) and "not_null" (rows whose leading column
+            is not NULL), in the order they are returned.
+        """
+        segments: list[str] = []
+        lead_order: Order = sort[0][1]
+
+        # The rest of the key's segment is empty if only the lead is left
+        if after[0] is not None or cls._tail_disjuncts(sort, after):
+            segments.append("after")
+
+        # NULLs come last in descending order and first in ascending order
+        if lead_order == Order.desc and after[0] is not None:
+            segments.append("null")
+        elif lead_order == Order.asc and after[0] is None:
+            segments.append("not_null")
+
+        return segments
+
+    @staticmethod
+    def _tail_disjuncts(sort: tuple[tuple[str, Order], ...], after: tuple) -> list[int]:
+        """Returns the key positions that can come after a key within its lead.
+
+        Args:
+            sort (tuple[tuple[str, Order], ...]): Key fields and their order.
+            after (tuple): Key of the last row of the previous page.
+        Returns:
+            The positions, after the leading one, with a row that can come after.
+        """
+        # Nothing sorts after NULL in descending order
+        return [
+            i
+            for i in range(1, len(sort))
+            if not (sort[i][1] == Order.desc and after[i] is None)
+        ]
+
+    @classmethod
+    def _keyset_predicate(
+        cls, sort: tuple[tuple[str, Order], ...], nulls: tuple[bool, ...]
+    ) -> Criterion:
+        """Returns the condition for rows after a key that share its lead segment.
+
+        For a non-NULL leading value `v` of a descending column `a` this is
+        `a <= v AND (a < v OR (a = v AND tail))`, where the first term lets
+        SQLite seek in an index and `tail` compares the remaining columns.
+        For a NULL leading value it is `a IS NULL AND tail`.
+
+        Args:
+            sort (tuple[tuple[str, Order], ...]): Key fields and their order.
+            nulls (tuple[bool, ...]): Whether each key value is NULL.
+        Returns:
+            The condition as a pypika `Criterion`.
+        """
+        key: tuple = tuple(None if null else 0 for null in nulls)
+        disjuncts: list[Criterion] = []
+
+        for i in cls._tail_disjuncts(sort, key):
+            field, order = sort[i]
+            column: Field = Field(field)
+
+            if order == Order.desc:
+                after_value: Criterion = (column < Parameter("?")) | column.isnull()
+            elif nulls[i]:
+                after_value = column.notnull()
+            else:
+                after_value = column > Parameter("?")
+
+            equal: list[Criterion] = [
+                Field(prev).isnull() if nulls[j] else Field(prev) == Parameter("?")
+                for j, (prev, _) in enumerate(sort[1:i], start=1)
+            ]
+            disjuncts.append(Criterion.all([*equal, after_value]))
+
+        lead: Field = Field(sort[0][0])
+        tail: Criterion | None = Criterion.any(disjuncts) if disjuncts else None
+
+        if nulls[0]:
+            return lead.isnull() & tail
+
+        if sort[0][1] == Order.desc:
+            bound, beyond = lead <= Parameter("?"), lead < Parameter("?")
+        else:
+            bound, beyond = lead >= Parameter("?"), lead > Parameter("?")
+
+        if tail is None:
+            return beyond
+
+        return bound & (beyond | ((lead == Parameter("?")) & tail))
+
+    @classmethod
+    def _keyset_params(cls, sort: tuple[tuple[str, Order], ...], after: tuple) -> list:
+        """Returns the values for the placeholders of the keyset predicate.
+
+        Args:
+            sort (tuple[tuple[str, Order], ...]): Key fields and their order.
+            after (tuple): Key of the last row of the previous page.
+        Returns:
+            The values in the order their placeholders are rendered.
+        """
+        disjuncts: list[int] = cls._tail_disjuncts(sort, after)
+        params: list = []
+
+        if after[0] is not None:
+            # bound and beyond, plus the equality in front of the tail
+            params.extend([after[0]] * (3 if disjuncts else 1))
+
+        for i in disjuncts:
+            params.extend(value for value in after[1:i] if value is not None)
+
+            if after[i] is not None:
+                params.append(after[i])
+
+        return params
+
+    def validate(self, record: AwardCriteriaRecord) -> None:
+        """Validates award criteria without compiling it.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Raises:
+            InvalidCriteriaError: If the name is not a non-empty string, or the
+                criteria uses unknown fields or operators.
+        """
+        self._name(record)
+        self._conditions(record)
+        self._sort(record)
+        self._limit(record)
+
+    def invalidate(self, name: str) -> None:
+        """Forgets the compiled queries of an award.
+
+        Args:
+            name (str): Name of the award criteria / scholarship.
+        """
+        with self.__lock:
+            for key in list(self.__keys_by_name.get(name.translate(_ASCII_LOWERCASE), ())):
+                self._forget(key)
+
+    def clear(self) -> None:
+        """Forgets every compiled query."""
+        with self.__lock:
+            self.__compiled.clear()
+            self.__keys_by_name.clear()
+            self.__names_by_key.clear()
+
+    def _link(self, name: str, key: Hashable) -> None:
+        """Records that an award uses a compiled query, with the lock held.
+
+        Args:
+            name (str): Name of the award criteria / scholarship.
+            key (Hashable): Key of the compiled query.
+        """
+        name = name.translate(_ASCII_LOWERCASE)
+        self.__keys_by_name.setdefault(name, set()).add(key)
+        self.__names_by_key.setdefault(key, set()).add(name)
+
+    def _forget(self, key: Hashable) -> None:
+        """Removes a compiled query and the awards linked to it, with the lock held.
+
+        Args:
+            key (Hashable): Key of the compiled query.
+        """
+        self.__compiled.pop(key, None)
+
+        for name in self.__names_by_key.pop(key, ()):
+            keys: set[Hashable] = self.__keys_by_name[name]
+            keys.discard(key)
+
+            if not keys:
+                del self.__keys_by_name[name]
+
+    def _compile(self, table_name: str, record: AwardCriteriaRecord) -> tuple[str, tuple]:
+        """Validates and compiles award criteria.
+
+        Args:
+            table_name (str): Name of the students table.
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A tuple of the SQL template and the values for its placeholders.
+        """
+        conditions, params = self._conditions(record)
+        sort: tuple[tuple[str, Order], ...] = self._sort(record)
+        limit: int = self._limit(record)
+
+        # If limit is specified, and not 0, add limit
+        if limit:
+            params.append(limit)
+
+        def build() -> str:
+            # The starting base query, if criteria is empty, becomes select all
+            query: Query = Query.from_(Table(table_name)).select("*")
+
+            for field, order in sort:
+                query = query.orderby(field, order=order)
+
+            query = query.where(self._criterion(conditions))
+
+            if limit:
+                query = query.limit(Parameter("?"))
+
+            return str(query)
+
+        sql: str = self.statements.get(
+            ("select_students_by_criteria", table_name, conditions, sort, bool(limit)),
+            build,
+        )
+
+        return sql, tuple(params)
+
+    def _conditions(
+        self, record: AwardCriteriaRecord
+    ) -> tuple[tuple[tuple, ...], list]:
+        """Returns the shape of the where clauses and their values.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A tuple of the conditions, each a (field, operator, number of values)
+            condition or an ("$and" or "$or", conditions) group, and the values
+            in the order their placeholders are rendered.
+        """
+        if not isinstance(record.criteria, dict):
+            raise InvalidCriteriaError(f"{record.name}: criteria must be an object.")
+
+        params: list = []
+        conditions: tuple[tuple, ...] = self._parse(
+            record, record.criteria, False, params
+        )
+
+        return conditions, params
+
+    def _parse(
+        self, record: AwardCriteriaRecord, criteria: Any, negate: bool, params: list
+    ) -> tuple[tuple, ...]:
+        """Returns the conditions of a criteria object.
+
+        The conditions are ANDed together, or, if `negate` is set, each one is
+        negated and they are ORed together, following De Morgan's laws.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria, for error messages.
+            criteria (Any): Criteria object mapping fields and logical operators to conditions.
+            negate (bool): Whether to return the negation of the criteria.
+            params (list): List the values are appended to.
+        Returns:
+            The conditions and groups of the criteria object.
+        """
+        if not isinstance(criteria, dict):
+            raise InvalidCriteriaError(f"{record.name}: criteria must be an object.")
+
+        conditions: list[tuple] = []
+
+        for field, item in criteria.items():
+            if field in ("$and", "$or"):
+                if not isinstance(item, list) or not item:
+                    raise InvalidCriteriaError(
+                        f"{record.name}: '{field}' requires a non-empty list."
+                    )
+
+                # Negating a group swaps AND and OR
+                junction: str = field
+                if negate:
+                    junction = "$or" if field == "$and" else "$and"
+                conditions.append(
+                    (
+                        junction,
+                        tuple(self._group(record, sub, negate, params) for sub in item),
+                    )
+                )
+            elif field == "$not":
+                conditions.append(self._group(record, item, not negate, params))
+            else:
+                self._check_field(record, field)
+
+                # If the value for field is not a dict, simply match for equality
+                operators: Any = item if isinstance(item, dict) else {"$eq": item}
+                conditions.extend(
+                    self._field_conditions(record, field, operators, negate, params)
+                )
+
+        return tuple(conditions)
+
+    def _group(
+        self, record: AwardCriteriaRecord, criteria: Any, negate: bool, params: list
+    ) -> tuple:
+        """Returns a criteria object as a single condition or group.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria, for error messages.
+            criteria (Any): Criteria object.
+            negate (bool): Whether to return the negation of the criteria.
+            params (list): List the values are appended to.
+        Returns:
+            A (field, operator, number of values) condition or a group.
+        """
+        conditions: tuple[tuple, ...] = self._parse(record, criteria, negate, params)
+
+        if not conditions:
+            raise InvalidCriteriaError(
+                f"{record.name}: nested criteria must not be empty."
+            )
+
+        if len(conditions) == 1:
+            return conditions[0]
+
+        return ("$or" if negate else "$and", conditions)
+
+    def _field_conditions(
+        self,
+        record: AwardCriteriaRecord,
+        field: str,
+        operators: Any,
+        negate: bool,
+        params: list,
+    ) -> list[tuple]:
+        """Returns the conditions of the operators on a field.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria, for error messages.
+            field (str): Name of the column.
+            operators (Any): Object mapping operators to their values.
+            negate (bool): Whether to negate the conditions, which are then ORed.
+            params (list): List the values are appended to.
+        Returns:
+            The conditions, ANDed together, or ORed if `negate` is set.
+        """
+        if not isinstance(operators, dict) or not operators:
+            raise InvalidCriteriaError(
+                f"{record.name}: operators on field '{field}' must be a non-empty object."
+            )
+
+        conditions: list[tuple] = []
+
+        for key, val in operators.items():
+            if key not in self.field_operators:
+                raise InvalidCriteriaError(
+                    f"{record.name}: unknown operator '{key}' on field '{field}'."
+                )
+
+            if key == "$not":
+                inner: Any = val if isinstance(val, dict) else {"$eq": val}
+                negated: list[tuple] = self._field_conditions(
+                    record, field, inner, not negate, params
+                )
+                conditions.append(
+                    negated[0]
+                    if len(negated) == 1
+                    else ("$and" if negate else "$or", tuple(negated))
+                )
+                continue
+
+            # $in and $nin take a list, $between two values, $exists none, the rest one
+            values: list = [val]
+
+            if key in self.list_operators:
+                if not isinstance(val, list):
+                    raise InvalidCriteriaError(
+                        f"{record.name}: '{key}' on field '{field}' requires a list."
+                    )
+                values = val
+            elif key == "$between":
+                if not isinstance(val, list) or len(val) != 2:
+                    raise InvalidCriteriaError(
+                        f"{record.name}: '$between' on field '{field}' requires [low, high]."
+                    )
+                values = val
+            elif key == "$exists":
+                if not isinstance(val, bool):
+                    raise InvalidCriteriaError(
+                        f"{record.name}: '$exists' on field '{field}' requires true or false."
+                    )
+                # IS NULL and IS NOT NULL cannot be parameterized
+                key, values = ("$exists" if val else "$nexists"), []
+            elif key in ("$like", "$regex"):
+                if not isinstance(val, str):
+                    raise InvalidCriteriaError(
+                        f"{record.name}: '{key}' on field '{field}' requires a string."
+                    )
+                if key == "$regex":
+                    try:
+                        _compile_regex(val)
+                    except re.error as e:
+                        raise InvalidCriteriaError(
+                            f"{record.name}: invalid '$regex' on field '{field}': {e}."
+                        ) from e
+
+            for value in values:
+                self._check_value(record, field, value)
+
+            conditions.append(
+                (field, self.negations[key] if negate else key, len(values))
+            )
+            params.extend(values)
+
+        return conditions
+
+    def _sort(self, record: AwardCriteriaRecord) -> tuple[tuple[str, Order], ...]:
+        """Returns the validated sort of an award.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A tuple of (field, order) pairs.
+        """
+        sort: list = record.sort or []
+
+        if not isinstance(sort, list):
+            raise InvalidCriteriaError(f"{record.name}: sort must be a list.")
+
+        pairs: list[tuple[str, Order]] = []
+
+        for item in sort:
+            if not isinstance(item, (list, tuple)) or len(item) != 2:
+                raise InvalidCriteriaError(
+                    f"{record.name}: sort entries must be [field, order] pairs."
+                )
+            field, order = item
+            self._check_field(record, field)
+
+            # If order is -1, order by descending, if 1 or any other value, ascending
+            pairs.append((field, Order.desc if order == -1 else Order.asc))
+
+        return tuple(pairs)
+
+    @staticmethod
+    def _name(record: AwardCriteriaRecord) -> str:
+        """Returns the validated name of an award.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            The name.
+        """
+        if not isinstance(record.name, str) or not record.name.strip():
+            raise InvalidCriteriaError(
+                f"{record.name!r}: name must be a non-empty string."
+            )
+
+        return record.name
+
+    def _limit(self, record: AwardCriteriaRecord) -> int:
+        """Returns the validated limit of an award.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            The limit, where 0 means no limit.
+        """
+        if record.limit is None:
+            return 0
+
+        if (
+            not isinstance(record.limit, int)
+            or isinstance(record.limit, bool)
+            or record.limit < 0
+        ):
+            raise InvalidCriteriaError(
+                f"{record.name}: limit must be a non-negative integer."
+            )
+
+        return record.limit
+
+    def _check_field(self, record: AwardCriteriaRecord, field: Any) -> None:
+        """Raises InvalidCriteriaError if `field` is not a students column."""
+        if field not in self.columns:
+            raise InvalidCriteriaError(f"{record.name}: unknown field '{field}'.")
+
+    def _check_value(self, record: AwardCriteriaRecord, field: str, value: Any) -> None:
+        """Raises InvalidCriteriaError if `value` cannot be bound to SQLite."""
+        if not isinstance(value, (str, int, float)) and value is not None:
+            raise InvalidCriteriaError(
+                f"{record.name}: invalid value {value!r} for field '{field}'."
+            )
@@ -0,0 +1,477 @@
+"""Provides classes for keeping a database compact and its statistics fresh.
+
+Provides the class `DatabaseMaintenance` for tracking how many rows of each
+table changed and how many pages of the file are free, and running `ANALYZE`,
+`PRAGMA optimize` and incremental `VACUUM` on a thread of its own when they
+are due, and the class `MaintenanceReport` for the outcome of one run, with
+the size of the database and the time taken by a set of queries before and
+after.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+class MaintenanceReport:
+    """Represents the outcome of a maintenance run.
+
+    Class for reporting what a maintenance run did, the size and free pages
+    of the database before and after, and the seconds taken by each probe
+    query before and after.
+    """
+
+    def __init__(
+        self,
+        actions: list[str],
+        size_before: int,
+        size_after: int,
+        free_pages_before: int,
+        free_pages_after: int,
+        timings_before: dict[str, float],
+        timings_after: dict[str, float],
+        seconds: float,
+        error: Exception | None = None,
+    ) -> None:
+        """Creates an instance of MaintenanceReport.
+
+        Args:
+            actions (list[str]): Statements run, in order.
+            size_before (int): Size of the database file before the run, in bytes.
+            size_after (int): Size of the database file after the run, in bytes.
+            free_pages_before (int): Pages on the freelist before the run.
+            free_pages_after (int): Pages on the freelist after the run.
+            timings_before (dict[str, float]): Seconds taken by each probe query before the run.
+            timings_after (dict[str, float]): Seconds taken by each probe query after the run.
+            seconds (float): Time taken by the run, probes excluded, in seconds.
+            error (Exception | None, optional): Error that stopped the run early. Defaults to None.
+        """
+        self.actions: list[str] = actions
+        self.size_before: int = size_before
+        self.size_after: int = size_after
+        self.free_pages_before: int = free_pages_before
+        self.free_pages_after: int = free_pages_after
+        self.timings_before: dict[str, float] = timings_before
+        self.timings_after: dict[str, float] = timings_after
+        self.seconds: float = seconds
+        self.error: Exception | None = error
+        self.finished_at: float = time.time()
+
+    @property
+    def reclaimed(self) -> int:
+        """Returns the bytes the run returned to the file system."""
+        return self.size_before - self.size_after
+
+    def to_dict(self) -> dict:
+        """Returns dict representation of MaintenanceReport.
+
+        Returns:
+            A dict that can be serialized to JSON.
+        """
+        return {
+            "actions": self.actions,
+            "size_before": self.size_before,
+            "size_after": self.size_after,
+            "free_pages_before": self.free_pages_before,
+            "free_pages_after": self.free_pages_after,
+            "timings_before_ms": {
+                name: round(seconds * 1000, 3)
+                for name, seconds in self.timings_before.items()
+            },
+            "timings_after_ms": {
+                name: round(seconds * 1000, 3)
+                for name, seconds in self.timings_after.items()
+            },
+            "seconds": self.seconds,
+            "error": str(self.error) if self.error is not None else None,
+            "finished_at": self.finished_at,
+        }
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the MaintenanceReport object.
+        """
+        before: float = sum(self.timings_before.values()) * 1000
+        after: float = sum(self.timings_after.values()) * 1000
+        actions: str = "; ".join(self.actions) if self.actions else "nothing to do"
+
+        return (
+            f"{actions} in {self.seconds:.3f} s, {self.size_before:,} -> "
+            f"{self.size_after:,} bytes, probes {before:.1f} -> {after:.1f} ms"
+        )
+
+
+class DatabaseMaintenance:
+    """Maintenance of a database.
+
+    Class for counting the rows changed in each table since it was last
+    analyzed, and running maintenance when asked to, either on the calling
+    thread with `run` or on a thread of its own with `schedule`. A run:
+
+    - analyzes the tables whose changed rows reach `churn_threshold` of
+      their rows, or that have no statistics, then runs `PRAGMA optimize`;
+    - if the free pages reach `fragmentation_threshold` of the file, returns
+      them to the file system with `PRAGMA incremental_vacuum`, converting
+      the file to incremental auto-vacuum with a full `VACUUM` the first time.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        probes: Callable[[], list[tuple[str, str, tuple]]],
+        file_path: str | None = None,
+        churn_threshold: float = 0.1,
+        fragmentation_threshold: float = 0.2,
+        min_free_pages: int = 256,
+        analysis_limit: int = 1000,
+        max_reports: int = 20,
+    ) -> None:
+        """Creates an instance of DatabaseMaintenance.
+
+        Args:
+            connect (Callable[[], sqlite3.Connection]): Returns the connection of the calling thread.
+            probes (Callable[[], list[tuple[str, str, tuple]]]): Returns the name, SQL and
+                parameters of the queries timed before and after each run.
+            file_path (str | None, optional): Path of the database file, whose size is
+                reported along with its write-ahead log. Defaults to None, the size in pages.
+            churn_threshold (float, optional): Fraction of a table's rows that must change
+                before it is analyzed again. Defaults to 0.1.
+            fragmentation_threshold (float, optional): Fraction of the pages that must be
+                free before they are vacuumed. Defaults to 0.2.
+            min_free_pages (int, optional): Free pages below which nothing is vacuumed. Defaults to 256.
+            analysis_limit (int, optional): Rows sampled per index by `ANALYZE`, 0 for all. Defaults to 1000.
+            max_reports (int, optional): Number of reports kept. Defaults to 20.
+        """
+        self.connect: Callable[[], sqlite3.Connection] = connect
+        self.probes: Callable[[], list[tuple[str, str, tuple]]] = probes
+        self.file_path: str | None = file_path
+        self.churn_threshold: float = churn_threshold
+        self.fragmentation_threshold: float = fragmentation_threshold
+        self.min_free_pages: int = min_free_pages
+        self.analysis_limit: int = analysis_limit
+        self.last_error: Exception | None = None
+        self.__reports: deque[MaintenanceReport] = deque(maxlen=max_reports)
+        # Table name to rows inserted, updated or deleted since it was analyzed
+        self.__churn: dict[str, int] = {}
+        self.__lock: threading.Lock = threading.Lock()
+        self.__run_lock: threading.Lock = threading.Lock()
+        self.__requested: threading.Event = threading.Event()
+        self.__idle: threading.Event = threading.Event()
+        self.__idle.set()
+        self.__stop: bool = False
+        self.__thread: threading.Thread | None = None
+
+    def record_churn(self, table_name: str, rows: int) -> None:
+        """Counts rows inserted, updated or deleted in a table.
+
+        Args:
+            table_name (str): Name of the table.
+            rows (int): Number of rows changed.
+        """
+        with self.__lock:
+            self.__churn[table_name] = self.__churn.get(table_name, 0) + rows
+
+    def forget(self, table_name: str) -> None:
+        """Stops tracking a table that was dropped.
+
+        Args:
+            table_name (str): Name of the table.
+        """
+        with self.__lock:
+            self.__churn.pop(table_name, None)
+
+    def churn(self) -> dict[str, int]:
+        """Returns the rows changed in each table since it was last analyzed.
+
+        Returns:
+            A dict from table name to number of rows.
+        """
+        with self.__lock:
+            return dict(self.__churn)
+
+    def schedule(self) -> None:
+        """Runs maintenance on the maintenance thread as soon as it is free.
+
+        Starts the thread on first use. Requests made while a run is in
+        progress are merged into one more run.
+        """
+        with self.__lock:
+            self.__idle.clear()
+            self.__requested.set()
+
+            if self.__thread is None:
+                self.__stop = False
+                self.__thread = threading.Thread(target=self._run_requested, daemon=True)
+                self.__thread.start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits until no maintenance is scheduled or running.
+
+        Args:
+            timeout (float | None, optional): Seconds to wait for. Defaults to None, no limit.
+        Returns:
+            True if the maintenance finished, False if the wait timed out.
+        """
+        return self.__idle.wait(timeout)
+
+    def stop(self) -> None:
+        """Stops the maintenance thread, letting a run in progress finish."""
+        with self.__lock:
+            thread: threading.Thread | None = self.__thread
+            self.__thread = None
+            self.__stop = True
+            self.__requested.set()
+
+        if thread is not None:
+            thread.join()
+
+        self.__idle.set()
+
+    def reports(self) -> list[MaintenanceReport]:
+        """Returns the reports of the last runs, oldest first.
+
+        Returns:
+            A list of MaintenanceReport.
+        """
+        with self.__lock:
+            return list(self.__reports)
+
+    def run(self) -> MaintenanceReport:
+        """Runs maintenance on the calling thread.
+
+        Returns:
+            The MaintenanceReport of the run.
+        """
+        with self.__run_lock:
+            conn: sqlite3.Connection = self.connect()
+            probes: list[tuple[str, str, tuple]] = self.probes()
+            actions: list[str] = []
+            error: sqlite3.Error | None = None
+
+            timings_before: dict[str, float] = self._time_probes(conn, probes)
+            size_before: int = self._size(conn)
+            free_pages_before, _ = self._pages(conn)
+            start: float = time.perf_counter()
+
+            try:
+                actions.extend(self._analyze(conn))
+                actions.extend(self._vacuum(conn))
+            # If the database is busy, the rest waits for the next run
+            except sqlite3.Error as e:
+                error = e
+
+            seconds: float = time.perf_counter() - start
+            free_pages_after, _ = self._pages(conn)
+            report: MaintenanceReport = MaintenanceReport(
+                actions,
+                size_before,
+                self._size(conn),
+                free_pages_before,
+                free_pages_after,
+                timings_before,
+                self._time_probes(conn, probes),
+                seconds,
+                error,
+            )
+
+        self._record(report)
+
+        return report
+
+    def _record(self, report: MaintenanceReport) -> None:
+        """Keeps the report of a run.
+
+        Args:
+            report (MaintenanceReport): Report of the run.
+        """
+        with self.__lock:
+            self.__reports.append(report)
+            self.last_error = report.error
+
+    def _run_requested(self) -> None:
+        """Runs maintenance each time it is scheduled, until stopped."""
+        while True:
+            self.__requested.wait()
+
+            with self.__lock:
+                if self.__stop:
+                    return
+                self.__requested.clear()
+
+            try:
+                self.run()
+            # Any error must not end the thread, or waits would never return
+            except Exception as e:
+                self._record(MaintenanceReport([], 0, 0, 0, 0, {}, {}, 0.0, e))
+            finally:
+                with self.__lock:
+                    if not self.__requested.is_set():
+                        self.__idle.set()
+
+    def _analyze(self, conn: sqlite3.Connection) -> list[str]:
+        """Analyzes the tables that changed enough, then lets SQLite optimize the rest.
+
+        Args:
+            conn (sqlite3.Connection): Connection outside of a transaction.
+        Returns:
+            The statements run.
+        """
+        actions: list[str] = []
+        churn: dict[str, int] = self.churn()
+
+        conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}").fetchall()
+
+        for table_name, rows in churn.items():
+            analyzed_rows: int | None = self._analyzed_rows(conn, table_name)
+
+            # If the table has statistics that are still close enough, leave it
+            if analyzed_rows is not None and rows < self.churn_threshold * analyzed_rows:
+                continue
+
+            exists: tuple | None = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table_name,),
+            ).fetchone()
+
+            if exists is not None:
+                statement: str = f"ANALYZE {self._quote(table_name)}"
+                conn.execute(statement)
+                conn.commit()
+                actions.append(statement)
+
+            with self.__lock:
+                # Rows changed while analyzing are counted for the next run
+                remaining: int = self.__churn.get(table_name, 0) - rows
+                if remaining > 0:
+                    self.__churn[table_name] = remaining
+                else:
+                    self.__churn.pop(table_name, None)
+
+        conn.execute("PRAGMA optimize").fetchall()
+        actions.append("PRAGMA optimize")
+
+        return actions
+
+    def _vacuum(self, conn: sqlite3.Connection) -> list[str]:
+        """Returns the free pages to the file system if there are enough of them.
+
+        Args:
+            conn (sqlite3.Connection): Connection outside of a transaction.
+        Returns:
+            The statements run.
+        """
+        free_pages, page_count = self._pages(conn)
+
+        if free_pages < self.min_free_pages or (
+            free_pages < self.fragmentation_threshold * page_count
+        ):
+            return []
+
+        (auto_vacuum,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+        actions: list[str] = []
+
+        # If the file does not track free pages for incremental vacuum, convert it once
+        if auto_vacuum != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            actions.extend(["PRAGMA auto_vacuum = INCREMENTAL", "VACUUM"])
+        else:
+            # Frees one page per step, and only a script is stepped to completion
+            conn.executescript("PRAGMA incremental_vacuum")
+            actions.append("PRAGMA incremental_vacuum")
+
+        # In WAL mode the file only shrinks once the log is checkpointed
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        return actions
+
+    def _time_probes(
+        self, conn: sqlite3.Connection, probes: list[tuple[str, str, tuple]]
+    ) -> dict[str, float]:
+        """Returns the seconds taken to fetch every row of each probe query.
+
+        Args:
+            conn (sqlite3.Connection): Connection to run the queries on.
+            probes (list[tuple[str, str, tuple]]): Name, SQL and parameters of each query.
+        Returns:
+            A dict from probe name to seconds, without the probes that failed.
+        """
+        timings: dict[str, float] = {}
+
+        for name, sql, params in probes:
+            start: float = time.perf_counter()
+
+            try:
+                conn.execute(sql, params).fetchall()
+            except sqlite3.Error:
+                continue
+
+            timings[name] = time.perf_counter() - start
+
+        return timings
+
+    def _size(self, conn: sqlite3.Connection) -> int:
+        """Returns the size of the database file and its write-ahead log, in bytes.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+        Returns:
+            The size in bytes, or the size of its pages if there is no file.
+        """
+        if self.file_path is None or not os.path.exists(self.file_path):
+            (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+            return page_size * self._pages(conn)[1]
+
+        size: int = os.path.getsize(self.file_path)
+
+        if os.path.exists(f"{self.file_path}-wal"):
+            size += os.path.getsize(f"{self.file_path}-wal")
+
+        return size
+
+    @staticmethod
+    def _pages(conn: sqlite3.Connection) -> tuple[int, int]:
+        """Returns the number of free pages and of all pages.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+        Returns:
+            A tuple of the freelist count and the page count.
+        """
+        (free_pages,) = conn.execute("PRAGMA freelist_count").fetchone()
+        (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+
+        return free_pages, page_count
+
+    @staticmethod
+    def _analyzed_rows(conn: sqlite3.Connection, table_name: str) -> int | None:
+        """Returns the number of rows a table had when it was last analyzed.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            table_name (str): Name of the table.
+        Returns:
+            The number of rows, or `None` if the table has no statistics.
+        """
+        try:
+            rows: list[tuple] = conn.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table_name,)
+            ).fetchall()
+        # If nothing has ever been analyzed, sqlite_stat1 does not exist
+        except sqlite3.OperationalError:
+            return None
+
+        if not rows:
+            return None
+
+        # Every statistic starts with the number of rows
+        return max(int(stat.split()[0]) for (stat,) in rows)
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        """Returns `identifier` quoted for use in SQL."""
+        return '"' + identifier.replace('"', '""') + '"'
@@ -0,0 +1,453 @@
+"""Provides classes for cataloging imported student datasets.
+
+Provides the class `DatasetCatalog` for recording every imported CSV file by
+its path, size, modification time and content hash, together with the table
+holding its rows, so a file that has not changed is reopened from its table
+without being parsed again, and the class `CatalogEntry` for one such record.
+Files are imported into a staging table that is renamed into place once it
+is complete, along with a full-text index of the table. Tables that have not
+been used recently are dropped once the cataloged tables exceed a disk budget.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pypika import Query, Table, Field, Column, Columns, Order, Parameter
+
+
+class CatalogEntry:
+    """Represents an imported dataset.
+
+    Class for representing the fingerprint of an imported CSV file and the
+    table its rows were imported into.
+    """
+
+    def __init__(
+        self,
+        table_id: int,
+        path: str,
+        size: int,
+        mtime_ns: int,
+        content_hash: str,
+        row_count: int = 0,
+        disk_bytes: int = 0,
+        last_used: float = 0.0,
+    ) -> None:
+        """Creates an instance of CatalogEntry.
+
+        Args:
+            table_id (int): Internal id of the table holding the rows.
+            path (str): File path the dataset was last opened from.
+            size (int): Size of the file, in bytes.
+            mtime_ns (int): Modification time of the file, in nanoseconds.
+            content_hash (str): SHA-256 of the file contents.
+            row_count (int, optional): Number of students in the table. Defaults to 0.
+            disk_bytes (int, optional): Disk space used by the table and its indexes. Defaults to 0.
+            last_used (float, optional): When the dataset was last opened, as a Unix time. Defaults to 0.0.
+        """
+        self.table_id: int = table_id
+        self.path: str = path
+        self.size: int = size
+        self.mtime_ns: int = mtime_ns
+        self.content_hash: str = content_hash
+        self.row_count: int = row_count
+        self.disk_bytes: int = disk_bytes
+        self.last_used: float = last_used
+
+    @property
+    def table_name(self) -> str:
+        """Returns the name of the table holding the rows."""
+        return f"{DatasetCatalog.table_prefix}{self.table_id}"
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the CatalogEntry object.
+        """
+        return f"{self.table_name}: {self.path} ({self.row_count} rows, {self.disk_bytes} bytes)"
+
+
+class DatasetCatalog:
+    """Catalog of imported datasets.
+
+    Class for finding the table of a previously imported CSV file by its
+    fingerprint, registering newly imported files, and evicting the least
+    recently used tables once they exceed `disk_budget` bytes.
+    """
+
+    table_name: str = "dataset_catalog"
+    table_prefix: str = "students_"
+    columns: list[Column] = Columns(
+        ("table_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("path", "TEXT"),
+        ("size", "INTEGER"),
+        ("mtime_ns", "INTEGER"),
+        ("content_hash", "TEXT"),
+        ("row_count", "INTEGER"),
+        ("disk_bytes", "INTEGER"),
+        ("last_used", "REAL"),
+    )
+    chunk_size: int = 1024 * 1024
+
+    def __init__(self, disk_budget: int = 256 * 1024 * 1024) -> None:
+        """Creates an instance of DatasetCatalog.
+
+        Args:
+            disk_budget (int, optional): Disk space the cataloged tables may use,
+                in bytes. Defaults to 256 MiB.
+        """
+        self.disk_budget: int = disk_budget
+
+    def create(self, conn: sqlite3.Connection) -> None:
+        """Creates the catalog table if it does not exist.
+
+        Run by the schema migration that creates the base tables, so the other
+        methods can assume the table exists.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+        """
+        query: Query = (
+            Query.create_table(self.table_name).columns(*self.columns).if_not_exists()
+        )
+        conn.execute(str(query))
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table_name}_content_hash "
+            f"ON {self.table_name} (content_hash)"
+        )
+
+    def match(
+        self, conn: sqlite3.Connection, file_path: str
+    ) -> tuple[CatalogEntry | None, CatalogEntry]:
+        """Finds the imported dataset with the same contents as a file.
+
+        A file whose path, size and modification time match an entry is
+        assumed unchanged without reading it. Otherwise the file is hashed
+        and matched by content, wherever it was imported from, and the
+        entry is updated to the file's current path and stat.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            file_path (str): File path for the CSV file.
+        Returns:
+            A tuple of the matching entry, or `None`, and the fingerprint of
+            the file as an unsaved entry.
+        """
+        stat: os.stat_result = os.stat(file_path)
+
+        # If the file is where it was, with the same size and time, it is unchanged
+        entry: CatalogEntry | None = self._select(
+            conn,
+            ("path", "size", "mtime_ns"),
+            (file_path, stat.st_size, stat.st_mtime_ns),
+        )
+
+        if entry is not None:
+            self.touch(conn, entry)
+            return entry, entry
+
+        fingerprint: CatalogEntry = CatalogEntry(
+            0, file_path, stat.st_size, stat.st_mtime_ns, self.content_hash(file_path)
+        )
+        entry = self._select(conn, ("content_hash",), (fingerprint.content_hash,))
+
+        if entry is not None:
+            entry.path = fingerprint.path
+            entry.size = fingerprint.size
+            entry.mtime_ns = fingerprint.mtime_ns
+            self.touch(conn, entry)
+
+        return entry, fingerprint
+
+    def reserve(
+        self, conn: sqlite3.Connection, fingerprint: CatalogEntry
+    ) -> CatalogEntry:
+        """Registers a dataset that is being imported and assigns it a table.
+
+        The entry is saved without its content hash, so it is not matched
+        until `swap` publishes the imported table.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            fingerprint (CatalogEntry): Fingerprint of the file, as returned by `match`.
+        Returns:
+            The reserved entry, whose rows are imported into `staging_name(entry)`.
+        """
+        fingerprint.last_used = time.time()
+        query: Query = Query.into(Table(self.table_name)).columns(
+            *[column.name for column in self.columns[1:]]
+        ).insert(*[Parameter("?")] * (len(self.columns) - 1))
+        values: list = list(self._values(fingerprint)[1:])
+        # The content hash is the fourth value after the id
+        values[3] = None
+
+        cursor: sqlite3.Cursor = conn.execute(str(query), values)
+        conn.commit()
+        fingerprint.table_id = cursor.lastrowid
+
+        return fingerprint
+
+    @staticmethod
+    def staging_name(entry: CatalogEntry) -> str:
+        """Returns the name of the staging table an entry is imported into.
+
+        Args:
+            entry (CatalogEntry): Reserved entry.
+        Returns:
+            The table name as a `str`.
+        """
+        return f"{entry.table_name}_staging"
+
+    @staticmethod
+    def search_name(entry: CatalogEntry) -> str:
+        """Returns the name of the full-text index of an entry's table.
+
+        Args:
+            entry (CatalogEntry): Cataloged entry.
+        Returns:
+            The name of the FTS5 table as a `str`.
+        """
+        return f"{entry.table_name}_search"
+
+    def swap(self, conn: sqlite3.Connection, entry: CatalogEntry) -> None:
+        """Publishes a staged import.
+
+        Renames the staging table of a reserved entry to the entry's table and
+        saves the entry, content hash included, in a single transaction, so
+        readers see either no table or the complete table with its indexes.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            entry (CatalogEntry): Reserved entry whose staging table is complete.
+        """
+        query: Query = Query.update(Table(self.table_name))
+
+        for column in self.columns[1:]:
+            query = query.set(column.name, Parameter("?"))
+
+        try:
+            conn.execute("BEGIN")
+            conn.execute(
+                f"ALTER TABLE {self._quote(self.staging_name(entry))} "
+                f"RENAME TO {self._quote(entry.table_name)}"
+            )
+            conn.execute(
+                str(query.where(Field("table_id") == Parameter("?"))),
+                self._values(entry)[1:] + (entry.table_id,),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def update(self, conn: sqlite3.Connection, entry: CatalogEntry) -> None:
+        """Saves the fingerprint, row count and size of an entry.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            entry (CatalogEntry): Entry to save.
+        """
+        query: Query = Query.update(Table(self.table_name))
+
+        for column in self.columns[1:]:
+            query = query.set(column.name, Parameter("?"))
+
+        conn.execute(
+            str(query.where(Field("table_id") == Parameter("?"))),
+            self._values(entry)[1:] + (entry.table_id,),
+        )
+        conn.commit()
+
+    def touch(self, conn: sqlite3.Connection, entry: CatalogEntry) -> None:
+        """Marks an entry as used now.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            entry (CatalogEntry): Entry that was opened.
+        """
+        entry.last_used = time.time()
+        self.update(conn, entry)
+
+    def remove(self, conn: sqlite3.Connection, entry: CatalogEntry) -> None:
+        """Drops the tables of an entry and forgets the entry.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            entry (CatalogEntry): Entry to remove.
+        """
+        try:
+            conn.execute("BEGIN")
+            conn.execute(str(Query.drop_table(entry.table_name).if_exists()))
+            conn.execute(str(Query.drop_table(self.staging_name(entry)).if_exists()))
+            conn.execute(str(Query.drop_table(self.search_name(entry)).if_exists()))
+            conn.execute(
+                str(
+                    Query.from_(self.table_name)
+                    .where(Field("table_id") == Parameter("?"))
+                    .delete()
+                ),
+                (entry.table_id,),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def prune(self, conn: sqlite3.Connection) -> list[CatalogEntry]:
+        """Removes the imports that never completed.
+
+        An entry is saved without its content hash by `reserve` and only gets
+        one from `swap`, so entries still without it are left over from
+        imports interrupted by a crash. They are never matched nor counted
+        against the disk budget, so they are removed along with their tables,
+        staging table included. Found through the content hash index, without
+        reading the schema.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database, with no import in progress.
+        Returns:
+            The entries that were removed.
+        """
+        query: Query = (
+            Query.from_(self.table_name)
+            .select(*[column.name for column in self.columns])
+            .where(Field("content_hash").isnull())
+        )
+        entries: list[CatalogEntry] = [
+            CatalogEntry(*row) for row in conn.execute(str(query)).fetchall()
+        ]
+
+        for entry in entries:
+            self.remove(conn, entry)
+
+        return entries
+
+    def entries(self, conn: sqlite3.Connection) -> list[CatalogEntry]:
+        """Returns every entry, most recently used first.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+        Returns:
+            A list of CatalogEntry.
+        """
+        query: Query = (
+            Query.from_(self.table_name)
+            .select(*[column.name for column in self.columns])
+            .orderby("last_used", order=Order.desc)
+        )
+
+        return [CatalogEntry(*row) for row in conn.execute(str(query)).fetchall()]
+
+    def evict(self, conn: sqlite3.Connection, keep: set[str]) -> list[CatalogEntry]:
+        """Drops least recently used tables until the catalog fits its budget.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            keep (set[str]): Names of tables that must not be dropped, such as the open one.
+        Returns:
+            The entries that were removed.
+        """
+        entries: list[CatalogEntry] = self.entries(conn)
+        used: int = sum(entry.disk_bytes for entry in entries)
+        evicted: list[CatalogEntry] = []
+
+        # Oldest entries are last
+        for entry in reversed(entries):
+            if used <= self.disk_budget:
+                break
+            if entry.table_name in keep:
+                continue
+
+            self.remove(conn, entry)
+            used -= entry.disk_bytes
+            evicted.append(entry)
+
+        return evicted
+
+    @classmethod
+    def measure(cls, conn: sqlite3.Connection, entry: CatalogEntry) -> int:
+        """Returns the disk space used by the table of an entry and its indexes.
+
+        Includes the shadow tables that store its full-text index. Uses the
+        `dbstat` virtual table, and falls back to the size of the imported
+        file when SQLite is built without it.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            entry (CatalogEntry): Entry whose table is measured.
+        Returns:
+            The size in bytes.
+        """
+        try:
+            (size,) = conn.execute(
+                "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = ? OR tbl_name GLOB ?)",
+                (entry.table_name, f"{cls.search_name(entry)}_*"),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return entry.size
+
+        return size
+
+    @classmethod
+    def content_hash(cls, file_path: str) -> str:
+        """Returns the SHA-256 of a file's contents.
+
+        Args:
+            file_path (str): Path to the file.
+        Returns:
+            The hash as a hexadecimal `str`.
+        """
+        digest = hashlib.sha256()
+
+        with open(file_path, "rb") as file:
+            while chunk := file.read(cls.chunk_size):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _select(
+        self, conn: sqlite3.Connection, fields: tuple[str, ...], values: tuple
+    ) -> CatalogEntry | None:
+        """Returns the most recently used entry whose fields equal some values.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            fields (tuple[str, ...]): Names of the fields compared.
+            values (tuple): Values of the fields.
+        Returns:
+            The CatalogEntry, or `None` if no entry matches.
+        """
+        query: Query = (
+            Query.from_(self.table_name)
+            .select(*[column.name for column in self.columns])
+            .orderby("last_used", order=Order.desc)
+            .limit(1)
+        )
+
+        for field in fields:
+            query = query.where(Field(field) == Parameter("?"))
+
+        row: tuple | None = conn.execute(str(query), values).fetchone()
+
+        return CatalogEntry(*row) if row is not None else None
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        """Returns `identifier` quoted for use in SQL."""
+        return '"' + identifier.replace('"', '""') + '"'
+
+    @staticmethod
+    def _values(entry: CatalogEntry) -> tuple:
+        """Returns the values of an entry in column order."""
+        return (
+            entry.table_id,
+            entry.path,
+            entry.size,
+            entry.mtime_ns,
+            entry.content_hash,
+            entry.row_count,
+            entry.disk_bytes,
+            entry.last_used,
+        )
@@ -0,0 +1,286 @@
+"""Provides a class for maintaining indexes driven by award criteria.
+
+Provides the class `IndexAdvisor` for deriving composite indexes on the
+students table from the fields that award criteria filter and sort on, and
+for creating, dropping and reporting those indexes.
+"""
+
+import hashlib
+import re
+import sqlite3
+from award_criteria_record import AwardCriteriaRecord
+from pypika import Query, Field, Parameter
+
+
+class IndexAdvisor:
+    """Derives and maintains indexes for award criteria.
+
+    Class for turning the criteria of every award into composite indexes on
+    the students table. Index columns follow the equality, sort, range rule:
+    fields matched for equality first (single values before `$in` lists),
+    then the sort fields, then the fields matched on a range, so one index
+    serves both the filter and the sort.
+    """
+
+    prefix: str = "scholarly_ix_"
+    equality_operators: set[str] = {"$eq"}
+    membership_operators: set[str] = {"$in"}
+    range_operators: set[str] = {"$gt", "$gte", "$lt", "$lte", "$between"}
+    # select_all_students lists every student by descending GPA, letters and
+    # forms go by name, and students are looked up by email and GPA band
+    default_keys: tuple[tuple[tuple[str, str], ...], ...] = (
+        (("cum_gpa", "DESC"),),
+        (("last_name", "ASC"), ("first_name", "ASC")),
+        (("normalized_email", "ASC"),),
+        (("gpa_band", "ASC"), ("cum_gpa", "DESC")),
+    )
+
+    def __init__(self, columns: list[str], covering: bool = False) -> None:
+        """Creates an instance of IndexAdvisor.
+
+        Args:
+            columns (list[str]): Names of the columns of the students table.
+            covering (bool, optional): Whether to append the remaining columns
+                to every index, so queries are answered from the index alone.
+                Defaults to False.
+        """
+        self.columns: list[str] = columns
+        self.covering: bool = covering
+
+    def index_key(self, record: AwardCriteriaRecord) -> tuple[tuple[str, str], ...]:
+        """Returns the index columns that serve an award.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A tuple of (column, "ASC" or "DESC") pairs, empty if no index helps.
+        """
+        equality: set[str] = set()
+        membership: set[str] = set()
+        ranges: set[str] = set()
+
+        for field, item in self._conjuncts(record.criteria or {}):
+            if field not in self.columns:
+                continue
+
+            # If the value for field is not a dict, it is matched for equality
+            operators: dict = item if isinstance(item, dict) else {"$eq": item}
+
+            if self.equality_operators & operators.keys():
+                equality.add(field)
+            elif self.membership_operators & operators.keys():
+                membership.add(field)
+            elif self.range_operators & operators.keys():
+                ranges.add(field)
+
+        key: list[tuple[str, str]] = [(field, "ASC") for field in sorted(equality)]
+        key.extend((field, "ASC") for field in sorted(membership))
+        used: set[str] = equality | membership
+
+        for field, order in record.sort or []:
+            if field in self.columns and field not in used:
+                key.append((field, "DESC" if order == -1 else "ASC"))
+                used.add(field)
+
+        key.extend((field, "ASC") for field in sorted(ranges - used))
+
+        return tuple(key)
+
+    @classmethod
+    def _conjuncts(cls, criteria: dict) -> list[tuple[str, object]]:
+        """Returns the field conditions every matching row satisfies.
+
+        Follows `$and` lists at any depth. `$or` and `$not` are skipped, since
+        no single index serves every branch.
+
+        Args:
+            criteria (dict): Criteria object of an award.
+        Returns:
+            A list of (field, value or object of operators) pairs.
+        """
+        conjuncts: list[tuple[str, object]] = []
+
+        for field, item in criteria.items():
+            if field == "$and" and isinstance(item, list):
+                for sub in item:
+                    if isinstance(sub, dict):
+                        conjuncts.extend(cls._conjuncts(sub))
+            # Other logical operators are not tied to a single field
+            elif not field.startswith("$"):
+                conjuncts.append((field, item))
+
+        return conjuncts
+
+    def advise(
+        self, records: list[AwardCriteriaRecord]
+    ) -> dict[tuple[tuple[str, str], ...], list[str]]:
+        """Returns the indexes needed by a set of awards.
+
+        Indexes whose columns are a prefix of another index are folded into
+        the longer index, since SQLite can use the longer one instead.
+
+        Args:
+            records (list[AwardCriteriaRecord]): Every award criteria.
+        Returns:
+            A dict from index key to the names of the awards it serves.
+        """
+        keys: dict[tuple[tuple[str, str], ...], list[str]] = {
+            key: []
+            for key in self.default_keys
+            if all(field in self.columns for field, _ in key)
+        }
+
+        for record in records:
+            key: tuple[tuple[str, str], ...] = self.index_key(record)
+
+            if key:
+                keys.setdefault(key, []).append(record.name)
+
+        # Fold keys that are a prefix of a longer key into the longer key
+        folded: dict[tuple[tuple[str, str], ...], list[str]] = {}
+
+        for key in sorted(keys, key=len, reverse=True):
+            target = next(
+                (longer for longer in folded if longer[: len(key)] == key), key
+            )
+            folded.setdefault(target, []).extend(keys[key])
+
+        return folded
+
+    def index_name(self, table_name: str, key: tuple[tuple[str, str], ...]) -> str:
+        """Returns the name of the managed index for a key on a table.
+
+        Args:
+            table_name (str): Name of the students table.
+            key (tuple[tuple[str, str], ...]): Index columns.
+        Returns:
+            The index name as a `str`.
+        """
+        digest: str = hashlib.sha1(
+            repr((table_name, key, self.covering)).encode()
+        ).hexdigest()
+        return f"{self.prefix}{digest[:16]}"
+
+    def apply(
+        self,
+        conn: sqlite3.Connection,
+        table_name: str,
+        records: list[AwardCriteriaRecord],
+        index_table: str | None = None,
+    ) -> dict[str, str]:
+        """Creates the advised indexes and drops stale ones.
+
+        Creates the indexes advised for `records` on `table_name` that do not
+        exist yet, and drops managed indexes that are no longer advised, in a
+        single transaction.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            table_name (str): Name of the students table.
+            records (list[AwardCriteriaRecord]): Every award criteria.
+            index_table (str | None, optional): Name of the table the index names
+                are derived from, when `table_name` is a staging table that will
+                be renamed to it. Defaults to `table_name`.
+        Returns:
+            A dict from award name to the name of the index built for it.
+        """
+        index_table = index_table or table_name
+        advice: dict[tuple[tuple[str, str], ...], list[str]] = self.advise(records)
+        advised: dict[str, tuple[tuple[str, str], ...]] = {
+            self.index_name(index_table, key): key for key in advice.keys()
+        }
+        existing: set[str] = set(self.managed_indexes(conn, table_name))
+
+        try:
+            conn.execute("BEGIN")
+
+            for name in existing - advised.keys():
+                conn.execute(f"DROP INDEX IF EXISTS {self._quote(name)}")
+
+            for name in advised.keys() - existing:
+                conn.execute(self._create_index_sql(name, table_name, advised[name]))
+
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        assignments: dict[str, str] = {}
+
+        for key, award_names in advice.items():
+            for award_name in award_names:
+                assignments[award_name] = self.index_name(index_table, key)
+
+        return assignments
+
+    def managed_indexes(self, conn: sqlite3.Connection, table_name: str) -> list[str]:
+        """Returns the names of the managed indexes on a table.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            table_name (str): Name of the students table.
+        Returns:
+            A list of index names.
+        """
+        query: Query = (
+            Query.from_("sqlite_master")
+            .select("name")
+            .where(Field("type") == "index")
+            .where(Field("tbl_name") == Parameter("?"))
+            .where(Field("name").like(Parameter("?")))
+        )
+        rows: list = conn.execute(str(query), (table_name, f"{self.prefix}%")).fetchall()
+
+        return [name for (name,) in rows]
+
+    @staticmethod
+    def indexes_used(conn: sqlite3.Connection, sql: str, params: tuple) -> list[str]:
+        """Returns the indexes SQLite plans to use for a query.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+            sql (str): SQL template of the query.
+            params (tuple): Values for the placeholders.
+        Returns:
+            A list of index names, empty if the query scans the whole table.
+        """
+        plan: list = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        names: list[str] = []
+
+        for *_, detail in plan:
+            match: re.Match | None = re.search(r"USING (?:COVERING )?INDEX (\S+)", detail)
+
+            if match and match.group(1) not in names:
+                names.append(match.group(1))
+
+        return names
+
+    def _create_index_sql(
+        self, name: str, table_name: str, key: tuple[tuple[str, str], ...]
+    ) -> str:
+        """Returns the CREATE INDEX statement for a key.
+
+        Args:
+            name (str): Name of the index.
+            table_name (str): Name of the students table.
+            key (tuple[tuple[str, str], ...]): Index columns.
+        Returns:
+            The statement as a `str`.
+        """
+        columns: list[str] = [f"{self._quote(field)} {order}" for field, order in key]
+
+        if self.covering:
+            used: set[str] = {field for field, _ in key}
+            columns.extend(
+                self._quote(field) for field in self.columns if field not in used
+            )
+
+        return (
+            f"CREATE INDEX IF NOT EXISTS {self._quote(name)} "
+            f"ON {self._quote(table_name)} ({', '.join(columns)})"
+        )
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        """Returns `identifier` quoted for use in SQL."""
+        return '"' + identifier.replace('"', '""') + '"'
@@ -7,6 +7,7 @@ contains methods for creating the application's GUI.
 import sys
 import webbrowser
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import (
@@ -23,11 +24,12 @@ from PyQt6.QtGui import (
     QFontInfo,
     QStandardItem
 )
-from PyQt6.QtCore import QEvent, Qt, QSize, QModelIndex, pyqtSlot
+from PyQt6.QtCore import QEvent, Qt, QSize, QModelIndex, QTimer, pyqtSignal, pyqtSlot
 from student_table_model import StudentTableModel
 from student_record import StudentRecord, read_student_data_from_csv, write_student_data_to_csv
 from award_criteria_record import AwardCriteriaRecord
-from scholarly_database import ScholarlyDatabase, FileIsOpenError
+from scholarly_database import ScholarlyDatabase, FileIsOpenError, ImportStatistics, RefreshSummary, CancelToken, QueryCancelledError
+from criteria_compiler import InvalidCriteriaError
 from letter_writer import LetterVariables, write_letter, write_letter_to_bytes
 from scholarly_menu_bar import ScholarlyMenuBar
 from scholarly_tab_bar import ScholarlyTabBar
@@ -45,6 +47,8 @@ from form_builder import create_outstanding_student_awards_form
 # Absolute address for file to prevent issues with
 # relative addresses when building app with PyInstaller
 BASE_DIR:str = os.path.dirname(__file__)
+# Seconds a Find may run before it is cancelled
+FIND_TIMEOUT:float = 10.0
 
 class ScholarlyMainWindow(QMainWindow):
     """Class for implementing the GUI for the Scholarly app.
@@ -52,18 +56,29 @@ class ScholarlyMainWindow(QMainWindow):
     Class for implementing the GUI for the Scholarly application.
     """
 
-    def __init__(self):
+    # Emitted from the Find worker with the token of the Find and its students or error
+    find_finished = pyqtSignal(object, object)
+
+    def __init__(self, in_memory: bool = False):
         """Creates an instance of ScholarlyMainWindow.
 
         Creates an instance of ScholarlyMainWindow, the GUI for the application.
+
+        Args:
+            in_memory (bool, optional): Whether to work on a copy of the database in memory,
+                written back periodically and on exit. Defaults to False.
         """
         super().__init__()
         self.menu_bar:ScholarlyMainWindow = None
         self.student_table: StudentTableModel = None
         self.student_table_view: QTableView = None
-        self.database: ScholarlyDatabase = ScholarlyDatabase(os.path.join(BASE_DIR, "database/scholarly.sqlite"))
+        self.database: ScholarlyDatabase = ScholarlyDatabase(os.path.join(BASE_DIR, "database/scholarly.sqlite"), in_memory=in_memory)
         self.generate_letters_tab:ScholarlyGenerateLettersTab = None
         self.tab_bar:ScholarlyTabBar = None
+        # Finds run one at a time off the GUI thread, each newer one cancels the last
+        self.find_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
+        self.find_token: CancelToken | None = None
+        self.find_finished.connect(self.show_find_results)
 
         self.initialize_ui()
 
@@ -112,6 +127,8 @@ class ScholarlyMainWindow(QMainWindow):
         self.send_emails_tab.toggleAll(False)
 
         self.manage_scholarships_tab =  ScholarlyManageScholarshipsTab(self.add_new_scholarship, self.edit_selected_scholarship, self.delete_selected_scholarships, self.refresh_scholarships)
+        # Keep the scholarship list and comboboxes in step with every committed change
+        self.database.add_award_criteria_listener(self.scholarships_changed)
         self.refresh_scholarships()
 
         self.student_awards_tab = ScholarlyOutstandingStudentAwardsTab(self.create_form)
@@ -123,6 +140,21 @@ class ScholarlyMainWindow(QMainWindow):
         # Add layout to central widget
         central_widget.setLayout(central_widget_layout)
 
+        # Stack the search box above the table, beside the tab bar
+        table_layout: QVBoxLayout = QVBoxLayout()
+
+        # Create search box, students are searched shortly after the user stops typing
+        self.search_text_box: QLineEdit = QLineEdit()
+        self.search_text_box.setPlaceholderText("Search students by name, email, major or ID")
+        self.search_text_box.setClearButtonEnabled(True)
+        self.search_text_box.setEnabled(False)
+        self.search_timer: QTimer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.search_students)
+        self.search_text_box.textChanged.connect(lambda _: self.search_timer.start())
+        table_layout.addWidget(self.search_text_box)
+
         # Create model and table view widget
         self.student_table = StudentTableModel()
         self.student_table_view: QTableView = QTableView()
@@ -138,7 +170,8 @@ class ScholarlyMainWindow(QMainWindow):
         # Add table view to central widget
         self.student_table_view.setModel(self.student_table)
         self.student_table_view.resizeColumnsToContents()
-        central_widget_layout.addWidget(self.student_table_view)
+        table_layout.addWidget(self.student_table_view)
+        central_widget_layout.addLayout(table_layout)
         
         # Add central widget to main window
         self.setCentralWidget(central_widget)
@@ -181,13 +214,31 @@ class ScholarlyMainWindow(QMainWindow):
         if not file_path:
             return
 
-        # If file is open, drop the table from the database before proceeding
-        if not self.database.get_students_table_name() is None:
-            self.close_file()
+        # If the open file is reopened, only apply the changes made to it
+        if file_path == self.database.get_students_file_path():
+            try:
+                refresh_summary: RefreshSummary = self.database.refresh_students_from_csv(file_path)
+            # If invalid data file, show error message, the loaded data is kept
+            except Exception as e:
+                QMessageBox.critical(
+                    self,
+                    "Invalid File",
+                    f"The file is not a CSV file, or is malformed.\n{type(e).__name__}: {e}",
+                )
+                return
+
+            # Reload table with the refreshed data
+            self.clear_search()
+            self.student_table = StudentTableModel(self.database.select_all_students())
+            self.student_table_view.setModel(self.student_table)
+
+            # Report what changed
+            self.statusBar().showMessage(f"Refreshed {refresh_summary}")
+            return
 
         try:
-            # Insert data from file to database
-            self.database.student_csv_to_table(file_path)
+            # Insert data from file to database, the open file stays open until it succeeds
+            import_statistics: ImportStatistics = self.database.student_csv_to_table(file_path)
         except FileIsOpenError as f:
             QMessageBox.warning(
                 self,
@@ -202,11 +253,10 @@ class ScholarlyMainWindow(QMainWindow):
                 "Invalid File",
                 f"The file is not a CSV file, or is malformed.\n{type(e).__name__}: {e}",
             )
-            print(self.database.get_students_table_name())
-            self.database.drop_table(self.database.get_students_table_name())
             return
 
         # Retrieve data from the database
+        self.clear_search()
         student_data = self.database.select_all_students()
 
         # Store data into table
@@ -214,10 +264,14 @@ class ScholarlyMainWindow(QMainWindow):
         self.student_table_view.setModel(self.student_table)
         self.student_table_view.resizeColumnsToContents()
 
+        # Report import throughput
+        self.statusBar().showMessage(f"Imported {import_statistics}")
+
         # Enable disabled components
         self.generate_letters_tab.toggleAll(True)
         self.send_emails_tab.toggleAll(True)
         self.student_awards_tab.toggleAll(True)
+        self.search_text_box.setEnabled(True)
 
         # Enable Save, Save As, and Close file actions on the menu bar
         self.menu_bar.saveActionToggle(True)
@@ -226,7 +280,7 @@ class ScholarlyMainWindow(QMainWindow):
 
     @pyqtSlot()
     def save_file(self) -> None:
-        file_path:str =self.database.get_students_table_name()
+        file_path:str =self.database.get_students_file_path()
 
         # If the name of the file is non-existent, prompt for path to store file
         if not file_path:
@@ -280,19 +334,55 @@ class ScholarlyMainWindow(QMainWindow):
 
         self.student_awards_tab.toggleAll(False)
 
-        # Drop the table from the database
-        self.database.drop_table(self.database.get_students_table_name())
-        self.database.set_students_table_name(None)
+        self.search_text_box.setEnabled(False)
+        self.clear_search()
+        self.cancel_find()
+
+        # Stop using the file, its table is kept so reopening it is instant
+        self.database.close_students_file()
 
         # Clear table view
         self.student_table = StudentTableModel()
         self.student_table_view.setModel(self.student_table)
+        self.statusBar().clearMessage()
 
         # Disable Save, Save As, and Close file actions
         self.menu_bar.saveActionToggle(False)
         self.menu_bar.saveAsActionToggle(False)
         self.menu_bar.closeActionToggle(False)
         
+    @pyqtSlot()
+    def search_students(self) -> None:
+        """Slot (event handler) for the search box.
+
+        Function called shortly after the text in the search box changes. Shows
+        the best matches for the text in the table, or every student if the
+        search box is empty.
+        """
+        # If no file is open, there is nothing to search
+        if not self.search_text_box.isEnabled():
+            return
+
+        text:str = self.search_text_box.text()
+        # The search supersedes any Find still running
+        self.cancel_find()
+
+        if text.strip():
+            student_data:list[StudentRecord] = self.database.search_students(text, 200)
+        else:
+            student_data = self.database.select_all_students()
+
+        self.student_table = StudentTableModel(student_data)
+        self.student_table_view.setModel(self.student_table)
+
+    def clear_search(self) -> None:
+        """Clears the search box without searching.
+        """
+        self.search_timer.stop()
+        self.search_text_box.blockSignals(True)
+        self.search_text_box.clear()
+        self.search_text_box.blockSignals(False)
+
     def closeEvent(self, event: QCloseEvent) -> None:
         """Event handler for closing the application.
 
@@ -308,7 +398,12 @@ class ScholarlyMainWindow(QMainWindow):
         )
 
         if reponse == QMessageBox.StandardButton.Yes:
+            # Stop any Find still running before closing its connection
+            self.cancel_find()
+            self.find_executor.shutdown(wait=True)
             self.close_file()
+            # Close the persistent database connections
+            self.database.close()
             event.accept()
         else:
             event.ignore()
@@ -396,18 +491,12 @@ class ScholarlyMainWindow(QMainWindow):
             return
 
         for student in student_data:
-            student_name:str = None
-
-            try:
-                student_last_name, student_first_name = student.name.split(",")
-                student_last_name = student_last_name.lstrip().rstrip()
-                student_first_name = student_first_name.lstrip().rstrip()
-
-
-                student_name = f"{student_first_name} {student_last_name}"
-            except ValueError as e:
-                QMessageBox.critical(self, "Invalid Arguments", f"Invalid student name: '{student.name}'.\nMust be in the format 'last_name, first_name'.\n{type(e).__name__}: {e}")
+            # The database splits names when students are imported
+            if student.first_name is None:
+                QMessageBox.critical(self, "Invalid Arguments", f"Invalid student name: '{student.name}'.\nMust be in the format 'last_name, first_name'.")
                 return
+
+            student_name:str = student.display_name
             
             letter_vars:LetterVariables = LetterVariables(student_name, date, amount, scholarship_name, academic_year_fall, academic_year_spring, sender_name, sender_email, sender_title)
             
@@ -485,18 +574,12 @@ class ScholarlyMainWindow(QMainWindow):
         sender_email = get_user_email_address(credentials)
        
         for student in student_data:
-            student_name:str = None
-
-            try:
-                student_last_name, student_first_name = student.name.split(",")
-                student_last_name = student_last_name.lstrip().rstrip()
-                student_first_name = student_first_name.lstrip().rstrip()
-
-
-                student_name = f"{student_first_name} {student_last_name}"
-            except ValueError as e:
-                QMessageBox.critical(self, "Invalid Arguments", f"Invalid student name: '{student.name}'.\nMust be in the format 'last_name, first_name'.\n{type(e).__name__}: {e}")
+            # The database splits names when students are imported
+            if student.first_name is None:
+                QMessageBox.critical(self, "Invalid Arguments", f"Invalid student name: '{student.name}'.\nMust be in the format 'last_name, first_name'.")
                 return
+
+            student_name:str = student.display_name
             
             letter_vars:LetterVariables = LetterVariables(student_name, date, amount, scholarship_name, academic_year_fall, academic_year_spring, sender_name, sender_email, sender_title)
             
@@ -622,6 +705,8 @@ class ScholarlyMainWindow(QMainWindow):
         if scholarship_name == "":
             # Clear selection
             self.student_table_view.clearSelection()
+            # A Find still running would replace the table once done
+            self.cancel_find()
             
             # Reset table to have entire contents of database
             student_data:list[StudentRecord] = self.database.select_all_students()
@@ -635,9 +720,7 @@ class ScholarlyMainWindow(QMainWindow):
 
             # If award criteria is valid, perform query and display results in table
             if isinstance(award_criteria_record, AwardCriteriaRecord):
-                student_data:list[StudentRecord] = self.database.select_students_by_criteria(award_criteria_record)
-                self.student_table = StudentTableModel(student_data)
-                self.student_table_view.setModel(self.student_table)
+                self.find_students(award_criteria_record)
             # If award criteriai is not valid, scholarship does not exist.
             else:
                 QMessageBox.information(self, "Invalid Scholarship", f"The scholarship '{scholarship_name}' does not exist. Please enter or select an existing scholarship.")
@@ -654,6 +737,8 @@ class ScholarlyMainWindow(QMainWindow):
         if scholarship_name == "":
             # Clear selection
             self.student_table_view.clearSelection()
+            # A Find still running would replace the table once done
+            self.cancel_find()
             
             # Reset table to have entire contents of database
             student_data:list[StudentRecord] = self.database.select_all_students()
@@ -667,30 +752,100 @@ class ScholarlyMainWindow(QMainWindow):
 
             # If award criteria is valid, perform query and display results in table
             if isinstance(award_criteria_record, AwardCriteriaRecord):
-                student_data:list[StudentRecord] = self.database.select_students_by_criteria(award_criteria_record)
-                self.student_table = StudentTableModel(student_data)
-                self.student_table_view.setModel(self.student_table)
+                self.find_students(award_criteria_record)
             # If award criteriai is not valid, scholarship does not exist.
             else:
                 QMessageBox.information(self, "Invalid Scholarship", f"The scholarship '{scholarship_name}' does not exist. Please enter or select an existing scholarship.")
 
+    def find_students(self, award_criteria_record: AwardCriteriaRecord) -> None:
+        """Starts a Find for the students meeting the award criteria.
+
+        Starts querying for the students meeting the award criteria off the
+        GUI thread, cancelling the previous Find if it is still running.
+        The results are shown by `show_find_results`.
+
+        Args:
+            award_criteria_record (AwardCriteriaRecord): Award criteria to query with.
+        """
+        self.cancel_find()
+        self.find_token = CancelToken()
+        self.find_executor.submit(self.run_find, award_criteria_record, self.find_token)
+
+    def run_find(self, award_criteria_record: AwardCriteriaRecord, token: CancelToken) -> None:
+        """Runs a Find on the worker thread.
+
+        Runs the query for the students meeting the award criteria, and emits
+        `find_finished` with the students, or the error raised.
+
+        Args:
+            award_criteria_record (AwardCriteriaRecord): Award criteria to query with.
+            token (CancelToken): Token that cancels this Find.
+        """
+        result: list[StudentRecord] | Exception
+
+        try:
+            with self.database.cancellable(token, FIND_TIMEOUT):
+                result = self.database.select_students_by_criteria(award_criteria_record)
+        except Exception as e:
+            result = e
+
+        self.find_finished.emit(token, result)
+
+    @pyqtSlot(object, object)
+    def show_find_results(self, token: CancelToken, result: object) -> None:
+        """Shows the results of a Find in the table.
+
+        Shows the results of a Find in the table, or the error it raised.
+        Results of a Find that has been superseded or cancelled are ignored.
+
+        Args:
+            token (CancelToken): Token of the Find.
+            result (object): Students found, or the error raised.
+        """
+        # If a newer Find has started, or this one was cancelled, ignore it
+        if token is not self.find_token or token.cancelled:
+            return
+
+        self.find_token = None
+
+        if isinstance(result, QueryCancelledError):
+            QMessageBox.warning(self, "Find Timed Out", f"The search took too long and was stopped. {result}")
+        elif isinstance(result, InvalidCriteriaError):
+            QMessageBox.warning(self, "Invalid Scholarship Criteria", f"{result}")
+        elif isinstance(result, Exception):
+            QMessageBox.critical(self, "Error", f"{result}")
+        else:
+            self.student_table = StudentTableModel(result)
+            self.student_table_view.setModel(self.student_table)
+
+    def cancel_find(self) -> None:
+        """Cancels the running Find, if any."""
+        if self.find_token is not None:
+            self.find_token.cancel()
+            self.find_token = None
+
     @pyqtSlot()
     def clear_selection(self)-> None:
         """Clears the selection in the table.
         """
         self.student_table_view.clearSelection()
 
-    def getScholarshipNames(self)-> list[str]:
-        records:list[AwardCriteriaRecord] = self.database.select_all_award_criteria()
+    def getScholarshipNames(self, records:list[AwardCriteriaRecord]=None)-> list[str]:
+        # If records are not given, get them from the database
+        if records is None:
+            records = self.database.select_all_award_criteria()
         scholarship_names:list[str] = [record.name for record in records]
 
         return scholarship_names
 
-    def load_combobox(self)-> None:
+    def load_combobox(self, records:list[AwardCriteriaRecord]=None)-> None:
         """Populates scholarship combobox with scholarship names.
 
         Populates scholarship combobox with scholarship names from the
         award criteria table in the database.
+
+        Args:
+            records (list[AwardCriteriaRecord], optional): Award criteria to list, or None for all of them. Defaults to None.
         """
         self.generate_letters_tab.scholarshipComboBoxClear()
         self.send_emails_tab.scholarshipComboBoxClear()
@@ -700,7 +855,7 @@ class ScholarlyMainWindow(QMainWindow):
         self.send_emails_tab.scholarshipComboBoxAddItem("")
         
         # Retrieve all award criteria
-        scholarship_names:list[str] = self.getScholarshipNames()
+        scholarship_names:list[str] = self.getScholarshipNames(records)
 
         self.generate_letters_tab.scholarshipComboxBoxAddItems(scholarship_names)
         self.send_emails_tab.scholarshipComboxBoxAddItems(scholarship_names)
@@ -716,21 +871,14 @@ class ScholarlyMainWindow(QMainWindow):
         if item_data:
             try:
                 self.database.insert_award_criteria(item_data)
+            except InvalidCriteriaError as e:
+                QMessageBox.critical(self, "Cannot Create Scholarship", f"Invalid scholarship criteria.\n{e}")
+                self.refresh_scholarships()
+                return
             except Exception:
                 QMessageBox.critical(self, "Cannot Create Scholarship", "Error creating scholarship.")
                 self.refresh_scholarships()
                 return
-            
-            item = QStandardItem(item_data.name)
-            item.setEditable(False)  # Make item non-editable
-            item.setData(
-                item_data, Qt.ItemDataRole.UserRole
-            )
-            # Store data in list view
-            self.manage_scholarships_tab.model.appendRow(item)
-
-        # Refresh scholarship info
-        self.refresh_scholarships()
 
 
     @pyqtSlot()
@@ -761,13 +909,14 @@ class ScholarlyMainWindow(QMainWindow):
                 # Update scholarship in database table
                 try:
                     self.database.update_award_criteria(scholarship_name, new_data.criteria, new_data.limit, new_data.sort)
+                except InvalidCriteriaError as e:
+                    QMessageBox.critical(self, "Cannot Update Scholarship", f"Invalid scholarship criteria.\n{e}")
+                    self.refresh_scholarships()
+                    return
                 except Exception:
                     QMessageBox.critical(self, "Cannot Update Scholarship", "Scholarship does not exist. Please refresh list.")
                     self.refresh_scholarships()
                     return
-                
-        
-        self.refresh_scholarships()
 
     @pyqtSlot()
     def delete_selected_scholarships(self):
@@ -785,18 +934,15 @@ class ScholarlyMainWindow(QMainWindow):
         # Remove items from bottom to top to avoid index issues
         selected_indexes.sort(reverse=True)
 
-        for index in selected_indexes:
-            scholarship = self.manage_scholarships_tab.model.itemFromIndex(index)
-
-            try:
-                self.database.remove_award_criteria(scholarship.text())
-            except Exception as e:
-                print(e)
-                QMessageBox.critical(self, "Error Deleting Scholarship", "Failed to delete scholarship. Scholarship does not exist. Refresh list.")
-
-        
-        # Refresh scholarship info
-        self.refresh_scholarships()
+        try:
+            # Delete every selected scholarship in one commit, or none of them
+            with self.database.transaction():
+                for index in selected_indexes:
+                    scholarship = self.manage_scholarships_tab.model.itemFromIndex(index)
+                    self.database.remove_award_criteria(scholarship.text())
+        except Exception as e:
+            QMessageBox.critical(self, "Error Deleting Scholarship", f"Failed to delete scholarships. No scholarships were deleted. Refresh list.\n{type(e).__name__}: {e}")
+            self.refresh_scholarships()
 
     @pyqtSlot()
     def refresh_scholarships(self):
@@ -808,6 +954,18 @@ class ScholarlyMainWindow(QMainWindow):
 
         self.manage_scholarships_tab.set_list_data(scholarships)
 
+    def scholarships_changed(self, scholarships:list[AwardCriteriaRecord])-> None:
+        """Shows the scholarships after they are added, edited or deleted.
+
+        Called by the database once a change to the award criteria is committed,
+        with every award criteria sorted by name.
+
+        Args:
+            scholarships (list[AwardCriteriaRecord]): All award criteria.
+        """
+        self.load_combobox(scholarships)
+        self.manage_scholarships_tab.set_list_data(scholarships)
+
     @pyqtSlot()
     def create_form(self):
 
@@ -834,22 +992,19 @@ class ScholarlyMainWindow(QMainWindow):
 
         form_link:str = None
 
+        # Specify criteria, the limit applies to each classification and gender
+        criteria:AwardCriteriaRecord = AwardCriteriaRecord("Outstanding Student Awards", {"classification": {"$in": categories}, "gender": {"$in": genders}, "major": "Computer Science"}, limit)
+        # Get the top students of every classification and gender at once
+        groups:dict[tuple, list[StudentRecord]] = self.database.select_top_students_by_group(criteria, ["classification", "gender"])
+
         # Create lists of candidates
-        for category in categories:
-            for gender in genders:
-                # Specify criteria
-                criteria:AwardCriteriaRecord = AwardCriteriaRecord(category, {"classification": category, "gender": gender, "major": "Computer Science"}, limit)
-                # Get students
-                students:list[StudentRecord] = self.database.select_students_by_criteria(criteria)
-
-                # Creating list of names
-                for student in students:
-                    student_last_name, student_first_name = student.name.split(",")
-                    student_last_name = student_last_name.lstrip().rstrip()
-                    student_first_name = student_first_name.lstrip().rstrip()
-                    student_name = f"{student_first_name} {student_last_name}"
-                    
-                    candidates[category][gender].append(student_name)
+        for (category, gender), students in groups.items():
+            category = category.lower()
+            gender = gender.lower()
+
+            # Creating list of names, as "first_name last_name"
+            for student in students:
+                candidates[category][gender].append(student.display_name)
         try:
             # Authorize user
             creds:Credentials = google_oauth()
@@ -891,7 +1046,8 @@ if __name__ == "__main__":
     # # Setting Up App font
     # app.setFont(appFont)
 
-    window: ScholarlyMainWindow = ScholarlyMainWindow()
+    # Memory mode copies every cached dataset into RAM, so it is opt-in
+    window: ScholarlyMainWindow = ScholarlyMainWindow(in_memory="--in-memory" in sys.argv)
     with open("style.qss", "r") as styleFile:
         app.setStyleSheet(styleFile.read())
 
@@ -0,0 +1,347 @@
+"""Provides a class for profiling the queries of a database.
+
+Provides the class `QueryProfiler` for timing every execution of the student
+queries and capturing the plan of each distinct query with
+`EXPLAIN QUERY PLAN`, and keeping a rolling log of the slow executions that
+can be dumped to JSON. Provides the class `SlowQuery`, for one entry of the
+log, and `QueryTimer`, for one execution being timed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class SlowQuery:
+    """Represents a slow execution of a query.
+
+    Class for representing the SQL, parameters, plan, number of rows and
+    elapsed time of a query that took longer than the slow query threshold.
+    """
+
+    def __init__(
+        self,
+        sql: str,
+        params: tuple,
+        plan: list[str],
+        rows: int,
+        elapsed: float,
+        executed_at: float,
+    ) -> None:
+        """Creates an instance of SlowQuery.
+
+        Args:
+            sql (str): SQL template of the query.
+            params (tuple): Values bound to its placeholders.
+            plan (list[str]): Steps of the query plan, as reported by `EXPLAIN QUERY PLAN`.
+            rows (int): Number of rows returned.
+            elapsed (float): Seconds from executing the query to fetching its last row.
+            executed_at (float): Time the query was executed, in seconds since the epoch.
+        """
+        self.sql: str = sql
+        self.params: tuple = params
+        self.plan: list[str] = plan
+        self.rows: int = rows
+        self.elapsed: float = elapsed
+        self.executed_at: float = executed_at
+
+    @property
+    def full_scans(self) -> list[str]:
+        """Returns the plan steps that read every row of a table."""
+        return [
+            step
+            for step in self.plan
+            if step.lstrip().startswith("SCAN ") and "INDEX" not in step
+        ]
+
+    @property
+    def temp_sorts(self) -> list[str]:
+        """Returns the plan steps that sort rows in a temporary B-tree."""
+        return [step for step in self.plan if "TEMP B-TREE" in step]
+
+    def to_dict(self) -> dict:
+        """Returns dict representation of SlowQuery.
+
+        Returns:
+            A dict that can be serialized to JSON.
+        """
+        return {
+            "sql": self.sql,
+            "params": list(self.params),
+            "plan": self.plan,
+            "rows": self.rows,
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+            "executed_at": self.executed_at,
+            "full_scans": self.full_scans,
+            "temp_sorts": self.temp_sorts,
+        }
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the SlowQuery object.
+        """
+        flags: str = "".join(
+            [
+                " [full scan]" if self.full_scans else "",
+                " [temp b-tree]" if self.temp_sorts else "",
+            ]
+        )
+        return f"{self.elapsed * 1000:.1f} ms, {self.rows} rows{flags}: {self.sql}"
+
+
+class QueryTimer:
+    """Times one execution of a query.
+
+    Class started just before a query is executed and finished once its
+    last row has been fetched.
+    """
+
+    __slots__ = ("profiler", "conn", "sql", "params", "plan", "start", "finished")
+
+    def __init__(
+        self,
+        profiler: "QueryProfiler",
+        conn: sqlite3.Connection,
+        sql: str,
+        params: tuple,
+        plan: list[str] | None,
+    ) -> None:
+        """Creates an instance of QueryTimer and starts timing.
+
+        Args:
+            profiler (QueryProfiler): Profiler the execution is reported to.
+            conn (sqlite3.Connection): Connection the query is executed on.
+            sql (str): SQL template of the query.
+            params (tuple): Values bound to its placeholders.
+            plan (list[str] | None): Plan of the query, if it has been captured.
+        """
+        self.profiler: QueryProfiler = profiler
+        self.conn: sqlite3.Connection = conn
+        self.sql: str = sql
+        self.params: tuple = params
+        self.plan: list[str] | None = plan
+        self.start: float = time.perf_counter()
+        self.finished: bool = False
+
+    def finish(self, rows: int) -> None:
+        """Stops timing and reports the execution, once.
+
+        Args:
+            rows (int): Number of rows the query returned.
+        """
+        if self.finished:
+            return
+
+        self.finished = True
+        self.profiler.record(
+            self.conn,
+            self.sql,
+            self.params,
+            self.plan,
+            rows,
+            time.perf_counter() - self.start,
+        )
+
+
+class QueryProfiler:
+    """Times queries and logs the slow ones.
+
+    Class for keeping the execution count, total and maximum time of every
+    query, the plan of each distinct query, and the last `max_entries`
+    executions that took at least `slow_threshold` seconds.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float = 0.1,
+        max_entries: int = 100,
+        capture_plans: bool = True,
+        max_plans: int = 256,
+    ) -> None:
+        """Creates an instance of QueryProfiler.
+
+        Args:
+            slow_threshold (float, optional): Seconds from which an execution is logged. Defaults to 0.1.
+            max_entries (int, optional): Number of slow executions kept. Defaults to 100.
+            capture_plans (bool, optional): Whether to capture the plan of every distinct
+                query when it is first executed, rather than only once it is slow. Defaults to True.
+            max_plans (int, optional): Maximum number of plans kept. Defaults to 256.
+        """
+        self.slow_threshold: float = slow_threshold
+        self.capture_plans: bool = capture_plans
+        self.max_plans: int = max_plans
+        self.__plans: OrderedDict[str, list[str]] = OrderedDict()
+        self.__slow_queries: deque[SlowQuery] = deque(maxlen=max_entries)
+        # SQL to [executions, total seconds, maximum seconds, rows]
+        self.__timings: dict[str, list] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def start(self, conn: sqlite3.Connection, sql: str, params: tuple) -> QueryTimer:
+        """Starts timing an execution of a query.
+
+        Captures the plan of the query first, if it is new and plans are
+        captured eagerly, so `EXPLAIN QUERY PLAN` is not part of the timing.
+
+        Args:
+            conn (sqlite3.Connection): Connection the query is executed on.
+            sql (str): SQL template of the query.
+            params (tuple): Values bound to its placeholders.
+        Returns:
+            The running QueryTimer.
+        """
+        plan: list[str] | None = None
+
+        if self.capture_plans:
+            plan = self.plan(conn, sql, params)
+
+        return QueryTimer(self, conn, sql, params, plan)
+
+    def plan(self, conn: sqlite3.Connection, sql: str, params: tuple) -> list[str]:
+        """Returns the plan of a query, running `EXPLAIN QUERY PLAN` the first time.
+
+        Args:
+            conn (sqlite3.Connection): Connection to run `EXPLAIN QUERY PLAN` on.
+            sql (str): SQL template of the query.
+            params (tuple): Values bound to its placeholders.
+        Returns:
+            The steps of the plan, indented by depth.
+        """
+        with self.__lock:
+            plan: list[str] | None = self.__plans.get(sql)
+
+            if plan is not None:
+                self.__plans.move_to_end(sql)
+                return plan
+
+        rows: list[tuple] = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        depths: dict[int, int] = {0: -1}
+        plan = []
+
+        # Each step is (id, parent, unused, detail)
+        for step_id, parent, _, detail in rows:
+            depths[step_id] = depths.get(parent, -1) + 1
+            plan.append("  " * depths[step_id] + detail)
+
+        with self.__lock:
+            self.__plans[sql] = plan
+
+            while len(self.__plans) > self.max_plans:
+                self.__plans.popitem(last=False)
+
+        return plan
+
+    def record(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: tuple,
+        plan: list[str] | None,
+        rows: int,
+        elapsed: float,
+    ) -> None:
+        """Records an execution of a query.
+
+        Args:
+            conn (sqlite3.Connection): Connection the query was executed on.
+            sql (str): SQL template of the query.
+            params (tuple): Values bound to its placeholders.
+            plan (list[str] | None): Plan of the query, captured now if slow and `None`.
+            rows (int): Number of rows returned.
+            elapsed (float): Seconds from executing the query to fetching its last row.
+        """
+        with self.__lock:
+            timing: list = self.__timings.setdefault(sql, [0, 0.0, 0.0, 0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+            timing[3] += rows
+
+        if elapsed < self.slow_threshold:
+            return
+
+        # If the plan was not captured up front, capture it now
+        if plan is None:
+            try:
+                plan = self.plan(conn, sql, params)
+            except sqlite3.Error:
+                plan = []
+
+        with self.__lock:
+            self.__slow_queries.append(
+                SlowQuery(sql, params, plan, rows, elapsed, time.time())
+            )
+
+    def slow_queries(self) -> list[SlowQuery]:
+        """Returns the logged slow executions, oldest first.
+
+        Returns:
+            A list of SlowQuery.
+        """
+        with self.__lock:
+            return list(self.__slow_queries)
+
+    def statistics(self) -> list[dict]:
+        """Returns the timings of every query, slowest in total first.
+
+        Returns:
+            A list of dicts with the SQL, number of executions, total, mean and
+            maximum milliseconds and number of rows returned.
+        """
+        with self.__lock:
+            timings: list[tuple[str, list]] = [
+                (sql, list(timing)) for sql, timing in self.__timings.items()
+            ]
+
+        return [
+            {
+                "sql": sql,
+                "executions": executions,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / executions, 3),
+                "max_ms": round(maximum * 1000, 3),
+                "rows": rows,
+            }
+            for sql, (executions, total, maximum, rows) in sorted(
+                timings, key=lambda item: item[1][1], reverse=True
+            )
+        ]
+
+    def dump(self, file_path: str) -> int:
+        """Writes the slow query log and timings to a JSON file.
+
+        The file is written next to its destination and then renamed, so it
+        is never left half written.
+
+        Args:
+            file_path (str): File path for the JSON file.
+        Returns:
+            The number of slow executions written.
+        """
+        slow_queries: list[SlowQuery] = self.slow_queries()
+        temp_path: str = f"{file_path}.tmp"
+
+        with open(temp_path, "w") as file:
+            json.dump(
+                {
+                    "slow_threshold_ms": self.slow_threshold * 1000,
+                    "slow_queries": [query.to_dict() for query in slow_queries],
+                    "statistics": self.statistics(),
+                },
+                file,
+                indent=4,
+            )
+
+        os.replace(temp_path, file_path)
+
+        return len(slow_queries)
+
+    def clear(self) -> None:
+        """Forgets every timing, plan and slow execution."""
+        with self.__lock:
+            self.__plans.clear()
+            self.__slow_queries.clear()
+            self.__timings.clear()
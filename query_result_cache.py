@@ -0,0 +1,89 @@
+"""Provides a class for caching the results of student queries.
+
+Provides the class `QueryResultCache`, a least recently used (LRU) cache of
+query results bounded by the total number of rows it holds. Keys include the
+version of the dataset, so results computed before a change are never served.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable
+from student_record import StudentRecord
+
+
+class QueryResultCache:
+    """Row-bounded LRU cache of query results.
+
+    Class for storing lists of `StudentRecord` keyed by (dataset version,
+    query), evicting the least recently used results once the cached rows
+    exceed `max_rows`.
+    """
+
+    def __init__(self, max_rows: int = 200000) -> None:
+        """Creates an instance of QueryResultCache.
+
+        Args:
+            max_rows (int, optional): Maximum number of rows kept across all results. Defaults to 200000.
+        """
+        self.max_rows: int = max_rows
+        self.rows: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__results: OrderedDict[Hashable, list[StudentRecord]] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def get(self, key: Hashable) -> list[StudentRecord] | None:
+        """Returns the cached result for a key.
+
+        Args:
+            key (Hashable): Dataset version and query.
+        Returns:
+            A new list of the cached records, or `None` on a miss.
+        """
+        with self.__lock:
+            result: list[StudentRecord] | None = self.__results.get(key)
+
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.__results.move_to_end(key)
+
+            return list(result)
+
+    def put(self, key: Hashable, result: list[StudentRecord]) -> None:
+        """Stores the result of a query.
+
+        Results larger than `max_rows` are not cached.
+
+        Args:
+            key (Hashable): Dataset version and query.
+            result (list[StudentRecord]): Records returned by the query.
+        """
+        if len(result) > self.max_rows:
+            return
+
+        with self.__lock:
+            previous: list[StudentRecord] | None = self.__results.pop(key, None)
+
+            if previous is not None:
+                self.rows -= len(previous)
+
+            self.__results[key] = list(result)
+            self.rows += len(result)
+
+            # Evict least recently used results
+            while self.rows > self.max_rows:
+                _, evicted = self.__results.popitem(last=False)
+                self.rows -= len(evicted)
+
+    def clear(self) -> None:
+        """Removes every cached result."""
+        with self.__lock:
+            self.__results.clear()
+            self.rows = 0
+
+    def __len__(self) -> int:
+        """Returns the number of cached results."""
+        return len(self.__results)
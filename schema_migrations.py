@@ -0,0 +1,139 @@
+"""Provides classes for upgrading the schema of a database in place.
+
+Provides the class `SchemaMigrator` for bringing a database up to the latest
+schema version, stored in `PRAGMA user_version`, by running the migrations it
+is missing in order, and the class `Migration` for one such step. Checking a
+database that is up to date reads the version from the file header only.
+"""
+
+import sqlite3
+from typing import Callable
+
+
+class SchemaVersionError(Exception):
+    """Class for defining the "SchemaVersion" exception."""
+
+    pass
+
+
+class Migration:
+    """Represents a step between two schema versions.
+
+    Class for a change to the schema, such as creating a table, adding
+    derived columns or building an index, that upgrades a database from the
+    previous version to `version`. The change runs inside a transaction and
+    must not commit.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        apply: Callable[[sqlite3.Connection], None],
+    ) -> None:
+        """Creates an instance of Migration.
+
+        Args:
+            version (int): Schema version the database is at after the migration.
+            description (str): What the migration changes.
+            apply (Callable[[sqlite3.Connection], None]): Function making the change on a connection.
+        """
+        self.version: int = version
+        self.description: str = description
+        self.apply: Callable[[sqlite3.Connection], None] = apply
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the Migration object.
+        """
+        return f"Migration({self.version}: {self.description})"
+
+
+class SchemaMigrator:
+    """Upgrades databases to the latest schema version.
+
+    Class for comparing the version stored in a database with the version of
+    the last migration, and running the missing migrations in order, each in
+    a transaction of its own that also records the new version.
+    """
+
+    def __init__(self, migrations: list[Migration]) -> None:
+        """Creates an instance of SchemaMigrator.
+
+        Args:
+            migrations (list[Migration]): Migrations numbered 1, 2, 3 and so on.
+        Raises:
+            ValueError: If the migrations are not numbered consecutively from 1.
+        """
+        self.migrations: list[Migration] = sorted(
+            migrations, key=lambda migration: migration.version
+        )
+
+        if [migration.version for migration in self.migrations] != list(
+            range(1, len(self.migrations) + 1)
+        ):
+            raise ValueError("Migrations must be numbered consecutively from 1.")
+
+    @property
+    def latest(self) -> int:
+        """Returns the schema version after every migration."""
+        return len(self.migrations)
+
+    @staticmethod
+    def version(conn: sqlite3.Connection) -> int:
+        """Returns the schema version of a database.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the database.
+        Returns:
+            The version stored in `PRAGMA user_version`, 0 for a new database.
+        """
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+
+        return version
+
+    def upgrade(self, conn: sqlite3.Connection) -> list[Migration]:
+        """Runs the migrations a database is missing.
+
+        Each migration takes the write lock before checking the version again,
+        so a database upgraded meanwhile by another connection is left as it
+        is. If a migration fails, the database stays at the last version that
+        completed.
+
+        Args:
+            conn (sqlite3.Connection): Connection outside of a transaction.
+        Returns:
+            The migrations that were run, empty if the database was up to date.
+        Raises:
+            SchemaVersionError: If the database is newer than the latest migration.
+        """
+        version: int = self.version(conn)
+
+        # If up to date, the version read is all the work done
+        if version == self.latest:
+            return []
+
+        if version > self.latest:
+            raise SchemaVersionError(
+                f"Database schema version {version} is newer than the supported "
+                f"version {self.latest}."
+            )
+
+        applied: list[Migration] = []
+
+        for migration in self.migrations[version:]:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+
+                if self.version(conn) < migration.version:
+                    migration.apply(conn)
+                    conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+                    applied.append(migration)
+
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+        return applied
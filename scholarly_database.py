@@ -6,14 +6,53 @@ and inserting records in the students table and award criteria table.
 """
 
 import sqlite3
+import heapq
 import json
+import math
+import os
+import textwrap
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterable, Iterator
 from student_record import (
     StudentRecord,
+    iter_student_rows_from_csv,
     read_student_data_from_csv,
     write_student_data_to_csv,
 )
 from award_criteria_record import AwardCriteriaRecord
-from pypika import Query, Table, Field, Schema, Column, Columns, Order
+from statement_cache import StatementCache
+from criteria_compiler import CriteriaCompiler, InvalidCriteriaError, regexp
+from index_advisor import IndexAdvisor
+from query_result_cache import QueryResultCache
+from dataset_catalog import CatalogEntry, DatasetCatalog
+from storage_profile import StorageProfile
+from query_profiler import QueryProfiler, QueryTimer
+from schema_migrations import Migration, SchemaMigrator
+from database_maintenance import DatabaseMaintenance, MaintenanceReport
+from pypika import Query, Table, Field, Schema, Column, Columns, Order, Parameter
+
+
+# Maps ASCII uppercase letters to lowercase, like SQLite's NOCASE collation
+_ASCII_LOWERCASE: dict[int, int] = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+class _Descending:
+    """Sort key wrapper that reverses the order of the wrapped value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value: Any = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
 
 
 class FileIsOpenError(Exception):
@@ -22,6 +61,165 @@ class FileIsOpenError(Exception):
     pass
 
 
+class MalformedRowError(Exception):
+    """Class for defining the "MalformedRow" exception."""
+
+    pass
+
+
+class QueryCancelledError(Exception):
+    """Class for defining the "QueryCancelled" exception."""
+
+    pass
+
+
+class CancelToken:
+    """Represents a request to stop queries.
+
+    Class shared between the thread running queries inside
+    `ScholarlyDatabase.cancellable` and any thread that may cancel them.
+    """
+
+    def __init__(self) -> None:
+        """Creates an instance of CancelToken that is not cancelled."""
+        self.__event: threading.Event = threading.Event()
+
+    def cancel(self) -> None:
+        """Cancels the queries using the token, from any thread."""
+        self.__event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether `cancel` has been called."""
+        return self.__event.is_set()
+
+
+class ImportStatistics:
+    """Represents the outcome of a bulk import.
+
+    Class for reporting how many rows were imported and how long it took.
+    """
+
+    def __init__(
+        self, file_path: str, rows: int, seconds: float, reused: bool = False
+    ) -> None:
+        """Creates an instance of ImportStatistics.
+
+        Args:
+            file_path (str): File path of the imported file.
+            rows (int): Number of rows imported.
+            seconds (float): Time taken by the import, in seconds.
+            reused (bool, optional): Whether the rows were reused from an earlier
+                import of the same file instead of being parsed. Defaults to False.
+        """
+        self.file_path: str = file_path
+        self.rows: int = rows
+        self.seconds: float = seconds
+        self.reused: bool = reused
+
+    @property
+    def rows_per_second(self) -> float:
+        """Returns the import throughput.
+
+        Returns:
+            Number of rows imported per second.
+        """
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the ImportStatistics object.
+        """
+        # Reused rows were not parsed, so there is no throughput to report
+        if self.reused:
+            return f"{self.rows} rows reopened in {self.seconds:.3f} s"
+
+        return (
+            f"{self.rows} rows in {self.seconds:.3f} s "
+            f"({self.rows_per_second:,.0f} rows/sec)"
+        )
+
+
+class RefreshSummary:
+    """Represents the outcome of an incremental refresh.
+
+    Class for reporting how many students were inserted, updated, deleted and
+    left unchanged when a students table was refreshed from a newer file.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        inserted: int,
+        updated: int,
+        deleted: int,
+        unchanged: int,
+        seconds: float,
+    ) -> None:
+        """Creates an instance of RefreshSummary.
+
+        Args:
+            file_path (str): File path of the refreshed file.
+            inserted (int): Number of students added.
+            updated (int): Number of students whose values changed.
+            deleted (int): Number of students no longer in the file.
+            unchanged (int): Number of students left as they were.
+            seconds (float): Time taken by the refresh, in seconds.
+        """
+        self.file_path: str = file_path
+        self.inserted: int = inserted
+        self.updated: int = updated
+        self.deleted: int = deleted
+        self.unchanged: int = unchanged
+        self.seconds: float = seconds
+
+    @property
+    def changed(self) -> int:
+        """Returns the number of students inserted, updated or deleted."""
+        return self.inserted + self.updated + self.deleted
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the RefreshSummary object.
+        """
+        return (
+            f"{self.inserted} inserted, {self.updated} updated, "
+            f"{self.deleted} deleted, {self.unchanged} unchanged "
+            f"in {self.seconds:.3f} s"
+        )
+
+
+class StudentPage:
+    """Represents one page of student records.
+
+    Class for a page returned by keyset pagination, holding the records and
+    the continuation token for the next page.
+    """
+
+    def __init__(
+        self, records: list[StudentRecord], after: tuple | None, returned: int
+    ) -> None:
+        """Creates an instance of StudentPage.
+
+        Args:
+            records (list[StudentRecord]): Records in the page.
+            after (tuple | None): Key of the last record, or `None` if this is the last page.
+            returned (int): Number of records returned so far, including this page.
+        """
+        self.records: list[StudentRecord] = records
+        self.after: tuple | None = after
+        self.returned: int = returned
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the StudentPage object.
+        """
+        return f"{len(self.records)} records, after={self.after}"
+
+
 class ScholarlyDatabase:
     """Class to operate SQLite3 database.
 
@@ -43,431 +241,2315 @@ class ScholarlyDatabase:
         ("gender", "TEXT COLLATE NOCASE"),
         ("in_state", "TEXT COLLATE NOCASE"),
     )
+    # Derived from the columns above by SQLite whenever a row is written,
+    # stored so they can be indexed. A name splits only with exactly one comma.
+    __derived_columns: list[Column] = Columns(
+        (
+            "first_name",
+            "TEXT GENERATED ALWAYS AS (CASE WHEN instr(\"name\", ',') > 0 "
+            "AND instr(substr(\"name\", instr(\"name\", ',') + 1), ',') = 0 "
+            "THEN trim(substr(\"name\", instr(\"name\", ',') + 1), "
+            "char(32, 9, 10, 11, 12, 13)) END) STORED",
+        ),
+        (
+            "last_name",
+            "TEXT GENERATED ALWAYS AS (CASE WHEN instr(\"name\", ',') > 0 "
+            "AND instr(substr(\"name\", instr(\"name\", ',') + 1), ',') = 0 "
+            "THEN trim(substr(\"name\", 1, instr(\"name\", ',') - 1), "
+            "char(32, 9, 10, 11, 12, 13)) END) STORED",
+        ),
+        (
+            "display_name",
+            "TEXT GENERATED ALWAYS AS (coalesce(\"first_name\" || ' ' || \"last_name\", "
+            "trim(\"name\", char(32, 9, 10, 11, 12, 13)))) STORED",
+        ),
+        (
+            "normalized_email",
+            "TEXT GENERATED ALWAYS AS "
+            "(lower(trim(\"email\", char(32, 9, 10, 11, 12, 13)))) STORED",
+        ),
+        # Lower bound of the half point band, 3.5 for a GPA from 3.5 up to but
+        # not including 4.0, which gets a band of its own
+        (
+            "gpa_band",
+            "REAL GENERATED ALWAYS AS (CAST(\"cum_gpa\" * 2 AS INTEGER) / 2.0) STORED",
+        ),
+    )
+    __students_table_columns: list[Column] = __students_columns + __derived_columns
     __award_criteria_columns: list[Column] = Columns(
         ("name", "TEXT PRIMARY KEY COLLATE NOCASE"),
         ("criteria", "JSON"),
         ("limit", "INTEGER"),
         ("sort", "JSON"),
     )
-
-    def __init__(self, file_path: str, students_table_name=None) -> None:
+    __connection_pragmas: list[str] = [
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA busy_timeout = 5000",
+    ]
+    __statement_cache_size: int = 128
+    # SQLite virtual machine instructions between checks for cancellation
+    __progress_steps: int = 10000
+    # Columns of the full-text index, searched for any substring
+    __search_columns: tuple[str, ...] = ("name", "email", "major", "student_ID")
+
+    def __init__(
+        self,
+        file_path: str,
+        students_table_name=None,
+        dataset_disk_budget: int = 256 * 1024 * 1024,
+        storage_profile: str = "balanced",
+        in_memory: bool = False,
+        checkpoint_interval: float = 30.0,
+        profile_queries: bool = False,
+        slow_query_threshold: float = 0.1,
+        auto_maintenance: bool = True,
+    ) -> None:
         """Creates an instance of ScholarlyDatabase.
 
         Creates an instance of ScholarlyDatabase for accessing and
-        performing queries on the SQLite3 database.
+        performing queries on the SQLite3 database. Connections are
+        opened lazily, one per thread, and kept open until `close` is called.
+        The first connection brings the schema up to date, running only the
+        migrations the database is missing.
+
+        In memory mode, the database file is copied into memory when the first
+        connection is opened, and every read and write goes to the copy. The
+        copy is written back to the file with the backup API every
+        `checkpoint_interval` seconds if it changed, and when `close` is called.
 
         Args:
             file_path (str): File path for the SQLite3 database.
+            students_table_name (str, optional): Name of the student table in usage. Defaults to None.
+            dataset_disk_budget (int, optional): Disk space the tables of imported
+                CSV files may use before the least recently used are dropped,
+                in bytes. Defaults to 256 MiB.
+            storage_profile (str, optional): Name of the storage profile applied to
+                every connection: "safe", "balanced" or "bulk-load". Defaults to "balanced".
+            in_memory (bool, optional): Whether to work on a copy of the database in memory. Defaults to False.
+            checkpoint_interval (float, optional): Seconds between writes of the copy in
+                memory to the file, which is the most work a crash can lose. Defaults to 30.0.
+            profile_queries (bool, optional): Whether to time the student queries, capture
+                their plans and log the slow ones. Defaults to False.
+            slow_query_threshold (float, optional): Seconds from which a student query
+                is logged as slow. Defaults to 0.1.
+            auto_maintenance (bool, optional): Whether to analyze and vacuum the database
+                on a background thread after every import and refresh. Defaults to True.
+        Raises:
+            UnknownStorageProfileError: If there is no profile called `storage_profile`.
         """
         self.database_path: str = file_path
+        self.__storage_profile: StorageProfile = StorageProfile.get(storage_profile)
+        self.in_memory: bool = in_memory
+        self.checkpoint_interval: float = checkpoint_interval
+        self.last_checkpoint: float | None = None
+        self.last_checkpoint_error: sqlite3.Error | None = None
+        # memdb databases are shared by every connection in the process that uses the same name
+        self.__memory_uri: str = f"file:/scholarly-{id(self)}?vfs=memdb"
+        self.__memory: sqlite3.Connection | None = None
+        self.__memory_version: int | None = None
+        self.__memory_lock: threading.RLock = threading.RLock()
+        self.__checkpoint_stop: threading.Event = threading.Event()
+        self.__checkpoint_thread: threading.Thread | None = None
+        # Per-thread depth of `transaction` blocks and the work deferred until they commit
+        self.__transactions: threading.local = threading.local()
+        # Per-thread (token, deadline) of the enclosing `cancellable` blocks
+        self.__cancellation: threading.local = threading.local()
         self.students_table_name = students_table_name
-
-    def get_students_table_name(self) -> str:
-        """Returns the name of the student table in usage.
+        self.students_file_path: str | None = None
+        self.__dataset: CatalogEntry | None = None
+        self.__catalog: DatasetCatalog = DatasetCatalog(dataset_disk_budget)
+        self.__connections: dict[int, sqlite3.Connection] = {}
+        self.__connections_lock: threading.Lock = threading.Lock()
+        self.__statements: StatementCache = StatementCache(self.__statement_cache_size)
+        self.__migrator: SchemaMigrator = SchemaMigrator(
+            [
+                Migration(
+                    1,
+                    "Create the award criteria and dataset catalog tables",
+                    self._migrate_base_tables,
+                ),
+                Migration(
+                    2,
+                    "Add the derived columns to imported students tables",
+                    self._migrate_derived_columns,
+                ),
+                Migration(
+                    3,
+                    "Build the full-text index of imported students tables",
+                    self._migrate_search_indexes,
+                ),
+            ]
+        )
+        self.__schema_checked: bool = False
+        self.__schema_lock: threading.RLock = threading.RLock()
+        self.__compiler: CriteriaCompiler = CriteriaCompiler(
+            [column.name for column in self.__students_table_columns], self.__statements
+        )
+        self.__index_advisor: IndexAdvisor = IndexAdvisor(
+            [column.name for column in self.__students_table_columns]
+        )
+        self.__results: QueryResultCache = QueryResultCache()
+        self.__profiler: QueryProfiler | None = (
+            QueryProfiler(slow_query_threshold) if profile_queries else None
+        )
+        self.auto_maintenance: bool = auto_maintenance
+        # The copy in memory has no file of its own to measure
+        self.__maintenance: DatabaseMaintenance = DatabaseMaintenance(
+            self.get_connection,
+            self._maintenance_probes,
+            None if in_memory else file_path,
+        )
+        self.__dataset_version: int = 0
+        self.__dataset_version_lock: threading.Lock = threading.Lock()
+        # Parsed award criteria keyed by name as NOCASE compares it, loaded on first use
+        self.__award_criteria: dict[str, AwardCriteriaRecord] | None = None
+        self.__award_criteria_lock: threading.RLock = threading.RLock()
+        self.__award_criteria_listeners: list[
+            Callable[[list[AwardCriteriaRecord]], Any]
+        ] = []
+
+    def __enter__(self) -> "ScholarlyDatabase":
+        """Opens the database when entering a `with` block.
 
         Returns:
-            str: Name of table.
+            The ScholarlyDatabase itself.
         """
-        return self.students_table_name
-
-    def set_students_table_name(self, table_name: str) -> None:
-        """Sets the name of the student table in usage.
+        return self.open()
 
-        Args:
-            table_name (str): Name of the table.
-        """
-        self.students_table_name = table_name
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Closes the database when leaving a `with` block."""
+        self.close()
 
-    @classmethod
-    def get_award_criteria_table_name(cls) -> str:
-        """Returns the name of the `award_criteria` table.
+    def open(self) -> "ScholarlyDatabase":
+        """Opens the connection for the calling thread.
 
-        Returns the name of the `award_criteria` table.
+        Opens and configures the connection for the calling thread if it is
+        not open already.
 
         Returns:
-            Name of the `award_criteria` table as a `str`.
+            The ScholarlyDatabase itself.
         """
-        return cls.__award_criteria_table_name
+        self.get_connection()
+        return self
 
-    @classmethod
-    def get_students_table_columns(cls) -> list[Column]:
-        """Returns the columns for the `students` table.
+    def close(self) -> None:
+        """Closes every open connection.
 
-        Returns the columns for the `students` table.
+        Closes the connections of every thread that has used the database.
+        Any uncommitted changes are rolled back. In memory mode, the copy in
+        memory is written to the file first, then released. Maintenance in
+        progress is allowed to finish first.
+        """
+        self.__maintenance.stop()
 
-        Returns:
-            Columns for the `students` table as `list[Column]`.
+        with self.__connections_lock:
+            connections: list[sqlite3.Connection] = list(self.__connections.values())
+            self.__connections.clear()
 
-        """
-        return cls.__students_columns
+        for conn in connections:
+            conn.close()
 
-    @classmethod
-    def get_award_criteria_columns(cls) -> list[Column]:
-        """Returns the columns for the `award_criteria` table.
+        # The schema is checked again when reopened, in case the file was replaced
+        self.__schema_checked = False
 
-        Returns the columns for the `award_criteria` table.
+        if self.__memory is not None:
+            self._unload_memory()
 
-        Returns:
-            Columns for the `award_criteria` table as `list[Column]`.
+    def get_connection(self) -> sqlite3.Connection:
+        """Returns the connection for the calling thread.
+
+        Returns the persistent connection for the calling thread, opening
+        and configuring it on first use.
 
+        Returns:
+            A `sqlite3.Connection` to the database.
         """
-        return cls.__award_criteria_columns
+        thread_id: int = threading.get_ident()
+        conn: sqlite3.Connection | None = self.__connections.get(thread_id)
 
-    def insert_student(self, record: StudentRecord) -> None:
-        """Inserts a student record into the `students` table.
+        if conn is None:
+            conn = self._connect()
+            with self.__connections_lock:
+                self.__connections[thread_id] = conn
 
-        Inserts a `StudentRecord` into the `students` table.
+            # The first connection upgrades the schema before anything uses it
+            if not self.__schema_checked:
+                try:
+                    self._migrate(conn)
+                except BaseException:
+                    with self.__connections_lock:
+                        self.__connections.pop(thread_id, None)
+                    conn.close()
+                    raise
 
-        Args:
-            record (StudentRecord): A student record.
-        """
-        query: Query = Query.into(self.students_table_name).insert(*record.to_tuple())
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
+        return conn
 
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
+    def get_schema_version(self) -> int:
+        """Returns the schema version of the database.
 
-    def insert_award_criteria(self, record: AwardCriteriaRecord) -> None:
-        """Inserts award criteria into the `award_criteria` table.
+        Returns:
+            The version stored in `PRAGMA user_version`.
+        """
+        return self.__migrator.version(self.get_connection())
 
-        Inserts award criteria into the `award_criteria` table.
+    def get_latest_schema_version(self) -> int:
+        """Returns the schema version databases are upgraded to.
 
-        Args:
-            record (AwardRecord): An award record.
+        Returns:
+            The version of the last migration.
         """
-        query: Query = Query.into(self.__award_criteria_table_name).insert(
-            record.name,
-            json.dumps(record.criteria),
-            record.limit,
-            json.dumps(record.sort),
-        )
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
+        return self.__migrator.latest
 
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
+    def _migrate(self, conn: sqlite3.Connection) -> list[Migration]:
+        """Runs the migrations the database is missing, once per opening.
 
-    def remove_award_criteria(self, name: str) -> None:
-        """Remove specified award criteria from table.
+        Also removes the catalog entries and staging tables of imports that
+        never completed.
 
         Args:
-            name (str): Name of the award criteria / scholarship.
+            conn (sqlite3.Connection): Connection of the calling thread.
+        Returns:
+            The migrations that were run.
+        Raises:
+            SchemaVersionError: If the database is newer than the latest migration.
         """
-        query: Query = (
-            Query.from_(self.__award_criteria_table_name)
-            .where(Field("name") == name)
-            .delete()
-        )
+        with self.__schema_lock:
+            # If another thread checked the schema while this one waited, it is done
+            if self.__schema_checked:
+                return []
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
+            applied: list[Migration] = self.__migrator.upgrade(conn)
+            # Imports interrupted by a crash leave a reservation and a staging table behind
+            self.__catalog.prune(conn)
+            self.__schema_checked = True
 
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
+        return applied
 
-    def update_award_criteria(
-        self, name: str, criteria: dict, limit: int, sort: list
-    ) -> None:
-        """Update the specified award criteria.
+    def _migrate_base_tables(self, conn: sqlite3.Connection) -> None:
+        """Migration 1: creates the award criteria and dataset catalog tables.
 
         Args:
-            name (str): Name of award criteria to update.
-            criteria (dict): Criteria of the award.
-            limit (int): Limit on returned matches.
-            sort (list): List specifying sorting behavior.
+            conn (sqlite3.Connection): Connection inside the migration's transaction.
         """
-        query: Query = (
-            Query.update(self.__award_criteria_table_name)
-            .set(Field("criteria"), json.dumps(criteria))
-            .set(Field("limit"), limit)
-            .set(Field("sort"), json.dumps(sort))
-            .where(Field("name") == name)
+        conn.execute(
+            str(
+                Query.create_table(self.__award_criteria_table_name)
+                .columns(*self.__award_criteria_columns)
+                .if_not_exists()
+            )
         )
+        self.__catalog.create(conn)
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
+    def _migrate_derived_columns(self, conn: sqlite3.Connection) -> None:
+        """Migration 2: adds the derived columns to imported students tables.
 
-    def create_table(self, table_name: str, columns: list[Column]):
-        """Creates a table in a SQLite database.
-
-        Creates a table in a SQlite Database file.
+        SQLite cannot add stored generated columns to a table, so each table
+        imported before they existed is rebuilt with them under the same
+        name, keeping its rowids. Its indexes and full-text index are dropped
+        with it, and built again when it is next opened and by migration 3.
 
         Args:
-            table_name (str): Name of the table.
-            columns (list[Column]): Columns for the table.
+            conn (sqlite3.Connection): Connection inside the migration's transaction.
         """
-        query: Query = Query.create_table(table_name).columns(*columns).if_not_exists()
+        names: str = ", ".join(
+            self._quote(column.name) for column in self.__students_columns
+        )
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
+        for entry in self.__catalog.entries(conn):
+            if not self.table_exists(entry.table_name) or self._has_derived_columns(
+                entry.table_name
+            ):
+                continue
 
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
+            table: str = self._quote(entry.table_name)
+            rebuilt: str = f"{entry.table_name}_migrating"
 
-    def drop_table(self, table_name: str):
-        """Drops a table from the database.
+            search: str = self._quote(self.__catalog.search_name(entry))
 
-        Drops a table from the SQLite3 database.
+            conn.execute(f"DROP TABLE IF EXISTS {search}")
+            conn.execute(
+                str(Query.create_table(rebuilt).columns(*self.__students_table_columns))
+            )
+            conn.execute(
+                f"INSERT INTO {self._quote(rebuilt)} (rowid, {names}) "
+                f"SELECT rowid, {names} FROM {table}"
+            )
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {self._quote(rebuilt)} RENAME TO {table}")
+
+    def _migrate_search_indexes(self, conn: sqlite3.Connection) -> None:
+        """Migration 3: builds the full-text index of imported students tables.
 
         Args:
-            table_name (str): Name of the table.
+            conn (sqlite3.Connection): Connection inside the migration's transaction.
         """
-        query: Query = Query.drop_table(table_name).if_exists()
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-
-        cursor.execute(str(query))
-        conn.commit()
-        conn.close()
-
-    def select_award_criteria(self, award_name: str) -> AwardCriteriaRecord | None:
-        """Gets the award criteria for a given award.
+        for entry in self.__catalog.entries(conn):
+            if self.table_exists(entry.table_name) and not self.table_exists(
+                self.__catalog.search_name(entry)
+            ):
+                self._create_search_index(conn, entry.table_name, entry)
 
-        Returns the award criteria for a given scholarship based on the name.
+    def _connect(self) -> sqlite3.Connection:
+        """Opens a new configured connection to the database.
 
-        Args:
-            award_name (str): Name of the scholarship or award.
         Returns:
-            Returns AwardCriteriaRecord if found, else returns None.
+            A new `sqlite3.Connection` with the connection PRAGMAs applied.
         """
-        query: Query = (
-            Query.from_(self.__award_criteria_table_name)
-            .select("*")
-            .where(Field("name") == award_name)
+        # If in memory mode, the copy in memory must exist before connecting to it
+        if self.in_memory:
+            self._load_memory()
+
+        # Connections stay bound to one thread, but may be closed from another
+        conn: sqlite3.Connection = sqlite3.connect(
+            self.__memory_uri if self.in_memory else self.database_path,
+            check_same_thread=False,
+            cached_statements=self.__statement_cache_size,
+            uri=self.in_memory,
         )
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(str(query))
+        for pragma in self.__connection_pragmas:
+            conn.execute(pragma)
 
-        data = cursor.fetchone()
-        record: AwardCriteriaRecord = None
-        # If record does exist
-        if data:
-            name, criteria, limit, sort = data
-            record = AwardCriteriaRecord(
-                name, json.loads(criteria), limit, json.loads(sort)
-            )
+        # Backs the REGEXP operator used by "$regex" criteria
+        conn.create_function("regexp", 2, regexp, deterministic=True)
 
-        conn.commit()
-        conn.close()
+        self.__storage_profile.apply(conn)
 
-        return record
+        return conn
 
-    def file_is_open(self, file_path: str) -> bool:
-        """Checks if the file actively open or not.
+    def checkpoint(self) -> bool:
+        """Writes the copy in memory to the database file.
 
-        Args:
-            file_path (str): Path to the file.
+        Copies the whole database with the backup API, unless nothing has
+        been committed since the last checkpoint.
 
         Returns:
-            bool: True if file is open, False otherwise.
+            True if the file was written, False if there was nothing to write.
         """
-        query: Query = (
-            Query.from_("sqlite_master")
-            .select("name")
-            .where(Field("type") == "table")
-            .where(Field("name") == file_path)
-        )
+        with self.__memory_lock:
+            if self.__memory is None:
+                return False
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(str(query))
+            # data_version changes whenever another connection commits
+            (version,) = self.__memory.execute("PRAGMA data_version").fetchone()
 
-        data = cursor.fetchone()
+            if version == self.__memory_version:
+                return False
 
-        file_exists: bool = False
+            disk: sqlite3.Connection = sqlite3.connect(self.database_path)
 
-        # If record does exist
-        if data != None:
-            file_exists = True
+            try:
+                self.__memory.backup(disk)
+            finally:
+                disk.close()
 
-        conn.commit()
-        conn.close()
+            self.__memory_version = version
+            self.last_checkpoint = time.time()
 
-        return file_exists
+            return True
 
-    def select_students_by_criteria(
-        self, record: AwardCriteriaRecord
-    ) -> list[StudentRecord]:
-        """Get student records by criteria.
+    def _load_memory(self) -> None:
+        """Copies the database file into memory, if it is not there already.
+
+        Also starts the thread that checkpoints the copy to the file.
+        """
+        with self.__memory_lock:
+            if self.__memory is not None:
+                return
+
+            # This connection keeps the copy alive and is only used for checkpoints
+            memory: sqlite3.Connection = sqlite3.connect(
+                self.__memory_uri, uri=True, check_same_thread=False
+            )
+            disk: sqlite3.Connection = sqlite3.connect(self.database_path)
+
+            try:
+                (journal_mode,) = disk.execute("PRAGMA journal_mode").fetchone()
+                # A copy of a WAL database cannot be opened in memory
+                disk.execute("PRAGMA journal_mode = DELETE").fetchall()
+                disk.backup(memory)
+                # The file keeps its own mode, checkpoints write into it as is
+                disk.execute(f"PRAGMA journal_mode = {journal_mode}").fetchall()
+            finally:
+                disk.close()
+
+            self.__memory = memory
+            (self.__memory_version,) = memory.execute("PRAGMA data_version").fetchone()
+
+            self.__checkpoint_stop.clear()
+            self.__checkpoint_thread = threading.Thread(
+                target=self._checkpoint_periodically, daemon=True
+            )
+            self.__checkpoint_thread.start()
+
+    def _unload_memory(self) -> None:
+        """Stops checkpointing, writes the copy in memory to the file and releases it."""
+        self.__checkpoint_stop.set()
+
+        if self.__checkpoint_thread is not None:
+            self.__checkpoint_thread.join()
+            self.__checkpoint_thread = None
+
+        with self.__memory_lock:
+            try:
+                self.checkpoint()
+            finally:
+                self.__memory.close()
+                self.__memory = None
+
+    def _checkpoint_periodically(self) -> None:
+        """Checkpoints every `checkpoint_interval` seconds until the copy is released."""
+        while not self.__checkpoint_stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+                self.last_checkpoint_error = None
+            # If the file is busy or unwritable, try again at the next interval
+            except sqlite3.Error as e:
+                self.last_checkpoint_error = e
+
+    def get_storage_profile(self) -> str:
+        """Returns the name of the storage profile in usage.
 
-        Returns students records matching criteria from the `students` table.
-        Args:
-            record (AwardCriteriaRecord): Scholarship criteria.
         Returns:
-            A list of StudentRecord matching the criteria for the award.
+            str: Name of the profile.
         """
-        # The starting base query, if criteria is empty, becomes select all
-        query: Query = Query.from_(self.students_table_name).select("*")
-
-        # If sort is specified, apply to select statement
-        if record.sort:
-            for field, order in record.sort:
-                sort_order: Order = None
-
-                # If order is -1, order by descending
-                if order == -1:
-                    sort_order = Order.desc
-                # If order is 1 or any other value, order by ascending
-                else:
-                    sort_order = Order.asc
-
-                # Add sort criteria to query
-                query = query.orderby(field, order=sort_order)
-
-        # Add where clauses if criteria is not empty
-        if record.criteria:
-            # Iterate over criterion in criteria dict
-            for field, item in record.criteria.items():
-                # If the value for field is a dict, the apply conditions to query
-                if isinstance(item, dict):
-                    for key, val in item.items():
-                        # If criteria is $in, check if value of field is in val
-                        if key == "$in":
-                            query = query.where(Field(field).isin(val))
-                        # If criteria is $nin, check if value of field is NOT in val
-                        elif key == "$nin":
-                            query = query.where(Field(field).notin(val))
-                        # If criteria is $gte, check if field val >= val
-                        elif key == "$gte":
-                            query = query.where(Field(field) >= val)
-                        # If criteria is $gt, check if field val > val
-                        elif key == "$gt":
-                            query = query.where(Field(field) > val)
-                        # If criteria is $lte, check if field val <= val
-                        elif key == "$lte":
-                            query = query.where(Field(field) <= val)
-                        # If criteria is $lt, check if field val < val
-                        elif key == "$lt":
-                            query = query.where(Field(field) < val)
-                        # If criteria is $eq, check if field val == val
-                        elif key == "$eq":
-                            query = query.where(Field(field) == val)
-                        # If criteria is $ne, check if field val != val
-                        elif key == "$ne":
-                            query = query.where(Field(field) != val)
-                # If the value for field is not a dict, simply match for equality
-                else:
-                    query = query.where(Field(field) == item)
-        # If limit is specified, and not 0, add limit
-        if record.limit:
-            query = query.limit(record.limit)
+        return self.__storage_profile.name
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(str(query))
+    def set_storage_profile(self, name: str) -> None:
+        """Applies a storage profile to every connection.
 
-        data = cursor.fetchall()
-        conn.commit()
-        conn.close()
+        Applies the profile to the open connections and to every connection
+        opened afterwards.
 
-        student_records: list[StudentRecord] = []
-        for record in data:
-            student_records.append(StudentRecord(*record))
+        Args:
+            name (str): Name of the profile: "safe", "balanced" or "bulk-load".
+        Raises:
+            UnknownStorageProfileError: If there is no profile called `name`.
+        """
+        self.__storage_profile = StorageProfile.get(name)
 
-        return student_records
+        with self.__connections_lock:
+            connections: list[sqlite3.Connection] = list(self.__connections.values())
 
-    def select_all_students(self) -> list[StudentRecord]:
-        """Gets all the student records.
+        for conn in connections:
+            self.__storage_profile.apply(conn)
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[sqlite3.Connection]:
+        """Applies the bulk-load profile to the calling thread's connection.
 
-        Returns all the student records from the `students` table.
+        Applies the `bulk-load` storage profile for the duration of a `with`
+        block, then restores the profile in usage. Syncing is only skipped
+        when the database is in WAL mode.
 
         Returns:
-            All of the student records as StudentRecords
+            The connection of the calling thread.
         """
-        query: Query = (
-            Query.from_(self.students_table_name)
-            .select("*")
-            .orderby("cum_gpa", order=Order.desc)
-        )
-
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(str(query))
-
-        data = cursor.fetchall()
-        conn.commit()
-        conn.close()
+        conn: sqlite3.Connection = self.get_connection()
+        StorageProfile.get("bulk-load").apply(conn)
 
-        student_records: list[StudentRecord] = []
-        for record in data:
-            student_records.append(StudentRecord(*record))
+        try:
+            yield conn
+        finally:
+            self.__storage_profile.apply(conn)
 
-        return student_records
+    def get_students_table_name(self) -> str:
+        """Returns the name of the student table in usage.
 
-    def student_csv_to_table(self, file_path: str):
-        """Gets student records from CSV and stores in the table.
+        Returns:
+            str: Name of table.
+        """
+        return self.students_table_name
 
-        Reads in student records from a CSV file and stores them in
-        the `students` table.
+    def set_students_table_name(self, table_name: str) -> None:
+        """Sets the name of the student table in usage.
 
         Args:
-            file_path (str): File path for the CSV file.
+            table_name (str): Name of the table.
         """
-        if self.file_is_open(file_path):
-            raise FileIsOpenError(f"File '{file_path}' is already open.")
+        self.students_table_name = table_name
 
-        self.set_students_table_name(file_path)
-        self.drop_table(self.students_table_name)
-        self.create_table(self.students_table_name, self.__students_columns)
+    def get_students_file_path(self) -> str | None:
+        """Returns the file path of the CSV file in usage.
 
-        data: list[StudentRecord] = read_student_data_from_csv(file_path)
+        Returns:
+            str: File path of the open CSV file, or `None` if no file is open.
+        """
+        return self.students_file_path
 
-        # Insert student records into database
-        for record in data:
-            self.insert_student(record)
+    def close_students_file(self) -> None:
+        """Stops using the open CSV file.
 
-    def award_criteria_json_to_table(self, file_path: str):
-        """Convienience function for populating table.
+        The table holding its rows is kept in the dataset catalog, so opening
+        the same file again reuses it.
+        """
+        self.students_table_name = None
+        self.students_file_path = None
+        self.__dataset = None
 
-        Function to assist with populating award criteria table.
+    def select_all_datasets(self) -> list[CatalogEntry]:
+        """Returns every imported dataset.
 
-        Args:
-            file_path (str): File path to JSON file.
+        Returns:
+            A list of CatalogEntry, most recently used first.
         """
-        with open(file_path, "r") as file:
-            data: list = json.load(file)
-
-            for record in data:
-                self.insert_award_criteria(AwardCriteriaRecord(**record))
+        return self.__catalog.entries(self.get_connection())
 
-    def select_all_award_criteria(self) -> list[AwardCriteriaRecord]:
-        """Returns all award criteria.
+    @classmethod
+    def get_award_criteria_table_name(cls) -> str:
+        """Returns the name of the `award_criteria` table.
 
-        Returns all award criteria in the table.
+        Returns the name of the `award_criteria` table.
 
         Returns:
-            A list of AwardCriteriaRecord.
+            Name of the `award_criteria` table as a `str`.
         """
-        query: Query = (
-            Query.from_(self.__award_criteria_table_name)
-            .select("*")
-            .orderby("name", order=Order.asc)
-        )
+        return cls.__award_criteria_table_name
 
-        conn: sqlite3.Connection = sqlite3.connect(self.database_path)
-        cursor: sqlite3.Cursor = conn.cursor()
-        cursor.execute(str(query))
+    @classmethod
+    def get_students_table_columns(cls) -> list[Column]:
+        """Returns the columns for the `students` table.
 
-        data: list = cursor.fetchall()
-        conn.commit()
-        conn.close()
+        Returns the columns for the `students` table, the columns of
+        `StudentRecord` followed by the columns SQLite derives from them.
 
-        award_records: list[AwardCriteriaRecord] = []
+        Returns:
+            Columns for the `students` table as `list[Column]`.
 
-        for name, criteria, limit, sort in data:
-            award_records.append(
-                AwardCriteriaRecord(name, json.loads(criteria), limit, json.loads(sort))
+        """
+        return cls.__students_table_columns
+
+    @classmethod
+    def get_award_criteria_columns(cls) -> list[Column]:
+        """Returns the columns for the `award_criteria` table.
+
+        Returns the columns for the `award_criteria` table.
+
+        Returns:
+            Columns for the `award_criteria` table as `list[Column]`.
+
+        """
+        return cls.__award_criteria_columns
+
+    def get_dataset_version(self) -> int:
+        """Returns the version of the student data.
+
+        Returns the version of the student data, which changes whenever a
+        students table is imported, edited or dropped.
+
+        Returns:
+            The dataset version as an `int`.
+        """
+        return self.__dataset_version
+
+    def _bump_dataset_version(self) -> None:
+        """Marks the student data as changed.
+
+        Increments the dataset version, so cached query results computed
+        against the previous version are never returned again.
+        """
+        with self.__dataset_version_lock:
+            self.__dataset_version += 1
+
+        self.__results.clear()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Groups writes into a single commit.
+
+        Every insert, update and delete made by the calling thread inside the
+        `with` block is committed once when the block ends, or rolled back
+        together if it raises. Index maintenance and cache invalidation run
+        once, after the commit. Nested blocks join the outermost one.
+        Methods that manage their own transaction, such as imports, cannot
+        be called inside the block.
+
+        Returns:
+            The connection of the calling thread.
+        """
+        conn: sqlite3.Connection = self.get_connection()
+        depth: int = getattr(self.__transactions, "depth", 0)
+
+        # If already inside a transaction, join it
+        if depth:
+            self.__transactions.depth = depth + 1
+            try:
+                yield conn
+            finally:
+                self.__transactions.depth = depth
+            return
+
+        # If a failed write left its implicit transaction open, discard it
+        if conn.in_transaction:
+            conn.rollback()
+
+        conn.execute("BEGIN")
+        self.__transactions.depth = 1
+        self.__transactions.deferred = {}
+
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            self.__transactions.award_criteria_changes = []
+            raise
+        finally:
+            self.__transactions.depth = 0
+            deferred: dict[Callable, None] = self.__transactions.deferred
+            self.__transactions.deferred = {}
+
+        for action in deferred:
+            action()
+
+    @contextmanager
+    def cancellable(
+        self, token: CancelToken | None = None, timeout: float | None = None
+    ) -> Iterator[CancelToken]:
+        """Lets the queries of the calling thread be cancelled or time out.
+
+        Every statement the calling thread runs inside the `with` block,
+        including fetching its rows, is interrupted once `token` is cancelled
+        from any thread, or once `timeout` seconds have passed since the block
+        was entered. Rows of iterators must be fetched inside the block to be
+        covered. Blocks can be nested, and each one enforces its own limit.
+
+        Args:
+            token (CancelToken | None, optional): Token that cancels the queries. Defaults to a new one.
+            timeout (float | None, optional): Seconds the block may run for. Defaults to None, no limit.
+        Returns:
+            The CancelToken of the block.
+        Raises:
+            QueryCancelledError: If a query is cancelled or runs past the deadline.
+        """
+        token = token if token is not None else CancelToken()
+        deadline: float | None = None if timeout is None else time.monotonic() + timeout
+        scope: tuple[CancelToken, float | None] = (token, deadline)
+
+        if self._expired(scope):
+            raise QueryCancelledError("Query cancelled before it started.")
+
+        conn: sqlite3.Connection = self.get_connection()
+        scopes: list[tuple[CancelToken, float | None]] | None = getattr(
+            self.__cancellation, "scopes", None
+        )
+
+        if not scopes:
+            scopes = self.__cancellation.scopes = []
+            # A true result makes SQLite stop the statement as interrupted
+            conn.set_progress_handler(
+                lambda: any(self._expired(item) for item in scopes),
+                self.__progress_steps,
+            )
+
+        scopes.append(scope)
+
+        try:
+            yield token
+        except sqlite3.OperationalError as e:
+            # If this block's limit stopped the statement, report it as such
+            if "interrupted" in str(e) and self._expired(scope):
+                if token.cancelled:
+                    raise QueryCancelledError("Query cancelled.") from e
+                raise QueryCancelledError(f"Query timed out after {timeout} s.") from e
+            raise
+        finally:
+            scopes.pop()
+
+            if not scopes:
+                conn.set_progress_handler(None, 0)
+
+    @staticmethod
+    def _expired(scope: tuple[CancelToken, float | None]) -> bool:
+        """Returns whether the token of a `cancellable` block is cancelled or its deadline passed."""
+        token, deadline = scope
+        return token.cancelled or (deadline is not None and time.monotonic() >= deadline)
+
+    def _after_commit(self, action: Callable[[], Any]) -> None:
+        """Runs an action now, or once after the enclosing `transaction` commits.
+
+        Args:
+            action (Callable[[], Any]): Action to run, deferred actions run once each.
+        """
+        if getattr(self.__transactions, "depth", 0):
+            self.__transactions.deferred[action] = None
+        else:
+            action()
+
+    def _execute(
+        self, shape: Hashable, build: Callable[[], Query | str], params: Iterable = ()
+    ) -> sqlite3.Cursor:
+        """Executes a parameterized statement.
+
+        Looks up the SQL template for `shape` in the statement cache, rendering
+        it with `build` on a miss, and executes it with `params` bound to its
+        `?` placeholders.
+
+        Args:
+            shape (Hashable): Key describing the query, without any values.
+            build (Callable[[], Query | str]): Function that renders the query.
+            params (Iterable, optional): Values for the placeholders. Defaults to ().
+        Returns:
+            The `sqlite3.Cursor` the statement was executed on.
+        """
+        sql: str = self.__statements.get(shape, lambda: str(build()))
+        return self.get_connection().execute(sql, tuple(params))
+
+    def _write(
+        self, shape: Hashable, build: Callable[[], Query | str], params: Iterable = ()
+    ) -> sqlite3.Cursor:
+        """Executes a write statement and commits it, unless inside `transaction`.
+
+        If the statement fails outside of a `transaction` block, the implicit
+        transaction it opened is rolled back, so the connection does not keep
+        holding the write lock.
+
+        Args:
+            shape (Hashable): Key describing the statement, without any values.
+            build (Callable[[], Query | str]): Function that renders the statement.
+            params (Iterable, optional): Values for the placeholders. Defaults to ().
+        Returns:
+            The `sqlite3.Cursor` the statement was executed on.
+        """
+        # Inside a transaction, the block rolls back everything on failure
+        if getattr(self.__transactions, "depth", 0):
+            return self._execute(shape, build, params)
+
+        conn: sqlite3.Connection = self.get_connection()
+
+        try:
+            cursor: sqlite3.Cursor = self._execute(shape, build, params)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        return cursor
+
+    def _query(
+        self, sql: str, params: Iterable = ()
+    ) -> tuple[sqlite3.Cursor, QueryTimer | None]:
+        """Executes a student query, timing it when queries are profiled.
+
+        Args:
+            sql (str): SQL template.
+            params (Iterable, optional): Values for the placeholders. Defaults to ().
+        Returns:
+            A tuple of the `sqlite3.Cursor` and the QueryTimer to finish once
+            the last row is fetched, or None if queries are not profiled.
+        """
+        conn: sqlite3.Connection = self.get_connection()
+        params = tuple(params)
+        timer: QueryTimer | None = None
+
+        if self.__profiler is not None:
+            timer = self.__profiler.start(conn, sql, params)
+
+        return conn.execute(sql, params), timer
+
+    def get_query_profiler(self) -> QueryProfiler | None:
+        """Returns the query profiler.
+
+        Returns:
+            The QueryProfiler, or None if queries are not profiled.
+        """
+        return self.__profiler
+
+    def run_maintenance(self) -> MaintenanceReport:
+        """Analyzes and vacuums the database on the calling thread, if due.
+
+        Analyzes the tables whose rows changed enough since they were last
+        analyzed, runs `PRAGMA optimize`, and returns free pages to the file
+        system once enough of the file is free, timing the queries of every
+        award on the students table in usage before and after.
+
+        Returns:
+            The MaintenanceReport of the run.
+        """
+        return self.__maintenance.run()
+
+    def schedule_maintenance(self) -> None:
+        """Runs `run_maintenance` on the background maintenance thread."""
+        self.__maintenance.schedule()
+
+    def wait_for_maintenance(self, timeout: float | None = None) -> bool:
+        """Waits until no maintenance is scheduled or running.
+
+        Args:
+            timeout (float | None, optional): Seconds to wait for. Defaults to None, no limit.
+        Returns:
+            True if the maintenance finished, False if the wait timed out.
+        """
+        return self.__maintenance.wait(timeout)
+
+    def get_maintenance_reports(self) -> list[MaintenanceReport]:
+        """Returns the reports of the last maintenance runs, oldest first.
+
+        Returns:
+            A list of MaintenanceReport.
+        """
+        return self.__maintenance.reports()
+
+    def _maintenance_probes(self) -> list[tuple[str, str, tuple]]:
+        """Returns the queries of every award on the students table in usage.
+
+        Returns:
+            A list of the award name, SQL and parameters of each query.
+        """
+        table_name: str | None = self.students_table_name
+
+        if not table_name or not self.table_exists(table_name):
+            return []
+
+        probes: list[tuple[str, str, tuple]] = []
+
+        for record in self.select_all_award_criteria():
+            try:
+                sql, params = self.__compiler.compile(table_name, record)
+            except InvalidCriteriaError:
+                continue
+            probes.append((record.name, sql, params))
+
+        return probes
+
+    def _maintain_after_import(self, table_name: str, rows: int) -> None:
+        """Counts the rows changed by an import and schedules maintenance.
+
+        Args:
+            table_name (str): Name of the students table changed.
+            rows (int): Number of rows inserted, updated or deleted.
+        """
+        self.__maintenance.record_churn(table_name, rows)
+
+        if self.auto_maintenance:
+            self.__maintenance.schedule()
+
+    def dump_slow_queries(self, file_path: str) -> int:
+        """Writes the slow query log and query timings to a JSON file.
+
+        Every logged query comes with its plan, and the plan steps that scan
+        a whole table or sort in a temporary B-tree, which point to award
+        criteria in need of an index.
+
+        Args:
+            file_path (str): File path for the JSON file.
+        Returns:
+            The number of slow queries written.
+        Raises:
+            ValueError: If queries are not profiled.
+        """
+        if self.__profiler is None:
+            raise ValueError("Queries are not profiled, set profile_queries to log them.")
+
+        return self.__profiler.dump(file_path)
+
+    def insert_student(self, record: StudentRecord) -> None:
+        """Inserts a student record into the `students` table.
+
+        Inserts a `StudentRecord` into the `students` table.
+
+        Args:
+            record (StudentRecord): A student record.
+        """
+        table_name: str = self.students_table_name
+        self._write(
+            ("insert_student", table_name),
+            lambda: Query.into(Table(table_name)).insert(
+                *[Parameter("?")] * len(self.__students_columns)
+            ),
+            record.to_tuple(),
+        )
+        self._after_commit(self._bump_dataset_version)
+
+    def insert_award_criteria(self, record: AwardCriteriaRecord) -> None:
+        """Inserts award criteria into the `award_criteria` table.
+
+        Inserts award criteria into the `award_criteria` table.
+
+        Args:
+            record (AwardRecord): An award record.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        self.__compiler.validate(record)
+        self._write(
+            ("insert_award_criteria",),
+            lambda: Query.into(self.__award_criteria_table_name).insert(
+                *[Parameter("?")] * len(self.__award_criteria_columns)
+            ),
+            (
+                record.name,
+                json.dumps(record.criteria),
+                record.limit,
+                json.dumps(record.sort),
+            ),
+        )
+        self._stage_award_criteria("put", record.name, record)
+        self._after_commit(self.update_indexes)
+
+    def remove_award_criteria(self, name: str) -> None:
+        """Remove specified award criteria from table.
+
+        Args:
+            name (str): Name of the award criteria / scholarship.
+        """
+        self._write(
+            ("remove_award_criteria",),
+            lambda: Query.from_(self.__award_criteria_table_name)
+            .where(Field("name") == Parameter("?"))
+            .delete(),
+            (name,),
+        )
+        self.__compiler.invalidate(name)
+        self._stage_award_criteria("remove", name)
+        self._after_commit(self.update_indexes)
+
+    def update_award_criteria(
+        self, name: str, criteria: dict, limit: int, sort: list
+    ) -> None:
+        """Update the specified award criteria.
+
+        Args:
+            name (str): Name of award criteria to update.
+            criteria (dict): Criteria of the award.
+            limit (int): Limit on returned matches.
+            sort (list): List specifying sorting behavior.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        self.__compiler.validate(AwardCriteriaRecord(name, criteria, limit, sort))
+        self._write(
+            ("update_award_criteria",),
+            lambda: Query.update(self.__award_criteria_table_name)
+            .set(Field("criteria"), Parameter("?"))
+            .set(Field("limit"), Parameter("?"))
+            .set(Field("sort"), Parameter("?"))
+            .where(Field("name") == Parameter("?")),
+            (json.dumps(criteria), limit, json.dumps(sort), name),
+        )
+        self.__compiler.invalidate(name)
+        self._stage_award_criteria(
+            "update", name, AwardCriteriaRecord(name, criteria, limit, sort)
+        )
+        self._after_commit(self.update_indexes)
+
+    def create_table(self, table_name: str, columns: list[Column]):
+        """Creates a table in a SQLite database.
+
+        Creates a table in a SQlite Database file.
+
+        Args:
+            table_name (str): Name of the table.
+            columns (list[Column]): Columns for the table.
+        """
+        sql: str = str(
+            Query.create_table(table_name).columns(*columns).if_not_exists()
+        )
+
+        self._write(("create_table", sql), lambda: sql)
+
+    def drop_table(self, table_name: str):
+        """Drops a table from the database.
+
+        Drops a table from the SQLite3 database.
+
+        Args:
+            table_name (str): Name of the table.
+        """
+        self._write(
+            ("drop_table", table_name),
+            lambda: Query.drop_table(table_name).if_exists(),
+        )
+
+        if table_name != self.__award_criteria_table_name:
+            self.__maintenance.forget(table_name)
+            self._after_commit(self._bump_dataset_version)
+        else:
+            self._stage_award_criteria("clear")
+
+    def select_award_criteria(self, award_name: str) -> AwardCriteriaRecord | None:
+        """Gets the award criteria for a given award.
+
+        Returns the award criteria for a given scholarship based on the name,
+        compared without case like the table does. Served from the parsed
+        award criteria kept in memory; the record is shared, so it must not
+        be modified.
+
+        Args:
+            award_name (str): Name of the scholarship or award.
+        Returns:
+            Returns AwardCriteriaRecord if found, else returns None.
+        """
+        return self._award_criteria().get(award_name.translate(_ASCII_LOWERCASE))
+
+    def file_is_open(self, file_path: str) -> bool:
+        """Checks if the file actively open or not.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            bool: True if file is open, False otherwise.
+        """
+        return (
+            file_path is not None
+            and file_path == self.students_file_path
+            and self.table_exists(self.students_table_name)
+        )
+
+    def table_exists(self, table_name: str) -> bool:
+        """Checks if a table exists in the database.
+
+        Args:
+            table_name (str): Name of the table.
+
+        Returns:
+            bool: True if the table exists, False otherwise.
+        """
+        cursor: sqlite3.Cursor = self._execute(
+            ("table_exists",),
+            lambda: Query.from_("sqlite_master")
+            .select("name")
+            .where(Field("type") == "table")
+            .where(Field("name") == Parameter("?")),
+            (table_name,),
+        )
+
+        data = cursor.fetchone()
+
+        table_exists: bool = False
+
+        # If record does exist
+        if data != None:
+            table_exists = True
+
+        return table_exists
+
+    def iter_students_by_criteria(
+        self, record: AwardCriteriaRecord, batch_size: int = 1000
+    ) -> Iterator[StudentRecord]:
+        """Yields student records by criteria.
+
+        Yields the students records matching criteria from the `students` table
+        as they are fetched, `batch_size` rows at a time, so the first records
+        are available before the query finishes. A cached result is yielded
+        directly when there is one.
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+            batch_size (int, optional): Number of rows fetched at a time. Defaults to 1000.
+        Returns:
+            An iterator of StudentRecord matching the criteria for the award.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        sql, params = self.__compiler.compile(self.students_table_name, record)
+        cached: list[StudentRecord] | None = self.__results.get(
+            (self.__dataset_version, sql, params)
+        )
+
+        if cached is not None:
+            return iter(cached)
+
+        cursor, timer = self._query(sql, params)
+
+        return self._iter_student_rows(cursor, batch_size, timer)
+
+    def iter_students(self, batch_size: int = 1000) -> Iterator[StudentRecord]:
+        """Yields all the student records.
+
+        Yields all the student records from the `students` table as they are
+        fetched, `batch_size` rows at a time. A cached result is yielded
+        directly when there is one.
+
+        Args:
+            batch_size (int, optional): Number of rows fetched at a time. Defaults to 1000.
+        Returns:
+            An iterator of all of the student records as StudentRecords.
+        """
+        table_name: str = self.students_table_name
+        cached: list[StudentRecord] | None = self.__results.get(
+            (self.__dataset_version, "select_all_students", table_name)
+        )
+
+        if cached is not None:
+            return iter(cached)
+
+        sql: str = self.__statements.get(
+            ("select_all_students", table_name),
+            lambda: str(
+                Query.from_(Table(table_name))
+                .select("*")
+                .orderby("cum_gpa", order=Order.desc)
+            ),
+        )
+        cursor, timer = self._query(sql)
+
+        return self._iter_student_rows(cursor, batch_size, timer)
+
+    def page_students(
+        self,
+        record: AwardCriteriaRecord,
+        after: tuple | None = None,
+        size: int = 100,
+        returned: int = 0,
+    ) -> StudentPage:
+        """Gets one page of student records by criteria.
+
+        Returns the students matching the criteria that come after the key
+        `after`, ordered by the award's sort columns with `student_ID` as the
+        tiebreaker. Pass the `after` and `returned` of a page to get the next
+        page. The award's limit caps the records returned across all pages.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+            after (tuple | None, optional): Continuation token of the previous page. Defaults to None.
+            size (int, optional): Maximum number of records in the page. Defaults to 100.
+            returned (int, optional): Records returned by the previous pages. Defaults to 0.
+        Returns:
+            A StudentPage with the records and the continuation token.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        if record.limit:
+            size = min(size, record.limit - returned)
+
+        if size <= 0:
+            return StudentPage([], None, returned)
+
+        queries, key_fields = self.__compiler.compile_page(
+            self.students_table_name, record, after
+        )
+        records: list[StudentRecord] = []
+
+        # Later queries continue where the earlier ones run out
+        for sql, params in queries:
+            remaining: int = size - len(records)
+            if remaining <= 0:
+                break
+
+            cursor, timer = self._query(sql, params + (remaining,))
+            records.extend(self._iter_student_rows(cursor, remaining, timer))
+
+        returned += len(records)
+        next_after: tuple | None = None
+
+        # A full page may be followed by more records
+        if len(records) == size and (not record.limit or returned < record.limit):
+            next_after = tuple(getattr(records[-1], field) for field in key_fields)
+
+        return StudentPage(records, next_after, returned)
+
+    def iter_pages(
+        self, record: AwardCriteriaRecord, size: int = 100
+    ) -> Iterator[StudentPage]:
+        """Yields every page of student records by criteria.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+            size (int, optional): Maximum number of records in a page. Defaults to 100.
+        Returns:
+            An iterator of StudentPage, in order.
+        """
+        page: StudentPage = self.page_students(record, size=size)
+        yield page
+
+        while page.after is not None:
+            page = self.page_students(record, page.after, size, page.returned)
+            yield page
+
+    @staticmethod
+    def _iter_student_rows(
+        cursor: sqlite3.Cursor, batch_size: int, timer: QueryTimer | None = None
+    ) -> Iterator[StudentRecord]:
+        """Yields the rows of a cursor as student records.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor of an executed students query.
+            batch_size (int): Number of rows fetched at a time.
+            timer (QueryTimer | None, optional): Timer of the query, finished
+                once the rows run out or the iterator is closed. Defaults to None.
+        Returns:
+            An iterator of StudentRecord.
+        """
+        fetched: int = 0
+
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                fetched += len(rows)
+                for row in rows:
+                    yield StudentRecord(*row)
+        finally:
+            cursor.close()
+
+            if timer is not None:
+                timer.finish(fetched)
+
+    def select_students_by_criteria(
+        self, record: AwardCriteriaRecord
+    ) -> list[StudentRecord]:
+        """Get student records by criteria.
+
+        Returns students records matching criteria from the `students` table.
+        The compiled query is memoized, so an unchanged award is only compiled once,
+        and its result is cached until the student data changes.
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria.
+        Returns:
+            A list of StudentRecord matching the criteria for the award.
+        Raises:
+            InvalidCriteriaError: If the criteria uses unknown fields or operators.
+        """
+        sql, params = self.__compiler.compile(self.students_table_name, record)
+        key: tuple = (self.__dataset_version, sql, params)
+
+        student_records: list[StudentRecord] = list(
+            self.iter_students_by_criteria(record)
+        )
+        self.__results.put(key, student_records)
+
+        return student_records
+
+    def select_all_students(self) -> list[StudentRecord]:
+        """Gets all the student records.
+
+        Returns all the student records from the `students` table. The
+        result is cached until the student data changes.
+
+        Returns:
+            All of the student records as StudentRecords
+        """
+        key: tuple = (
+            self.__dataset_version,
+            "select_all_students",
+            self.students_table_name,
+        )
+
+        student_records: list[StudentRecord] = list(self.iter_students())
+        self.__results.put(key, student_records)
+
+        return student_records
+
+    def search_students(self, text: str, limit: int = 50) -> list[StudentRecord]:
+        """Finds students by name, email, major or student ID.
+
+        Every word of `text` must appear somewhere in the student's name,
+        email, major or student ID, in any case. Words of three or more
+        characters are looked up in the full-text index and the matches are
+        ranked by relevance. Shorter words only filter those matches, or, if
+        every word is shorter, are matched by scanning the table in name order.
+
+        Args:
+            text (str): Words to look for.
+            limit (int, optional): Maximum number of students returned. Defaults to 50.
+        Returns:
+            A list of StudentRecord, best matches first. Empty if no file is open.
+        """
+        words: list[str] = text.split()
+
+        if not words or self.__dataset is None:
+            return []
+
+        table_name: str = self.students_table_name
+        search_name: str = self.__catalog.search_name(self.__dataset)
+        # The trigram tokenizer indexes every three characters
+        indexed: list[str] = [word for word in words if len(word) >= 3]
+        scanned: list[str] = [word for word in words if len(word) < 3]
+
+        def build() -> str:
+            table: str = self._quote(table_name)
+            search: str = self._quote(search_name)
+            # LIKE folds ASCII case like the trigram tokenizer
+            conditions: list[str] = [
+                "("
+                + " OR ".join(
+                    f"{table}.{self._quote(column)} LIKE ? ESCAPE '\\'"
+                    for column in self.__search_columns
+                )
+                + ")"
+            ] * len(scanned)
+
+            if indexed:
+                conditions.insert(0, f"{search} MATCH ?")
+                return (
+                    f"SELECT {table}.* FROM {search} "
+                    f"JOIN {table} ON {table}.rowid = {search}.rowid "
+                    f"WHERE {' AND '.join(conditions)} "
+                    f"ORDER BY {search}.rank LIMIT ?"
+                )
+
+            return (
+                f"SELECT * FROM {table} WHERE {' AND '.join(conditions)} "
+                'ORDER BY "name" LIMIT ?'
+            )
+
+        params: list = []
+
+        if indexed:
+            # Each word is a phrase, so FTS5 syntax in it is taken literally
+            params.append(
+                " ".join('"' + word.replace('"', '""') + '"' for word in indexed)
+            )
+
+        for word in scanned:
+            pattern: str = (
+                word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            )
+            params.extend([f"%{pattern}%"] * len(self.__search_columns))
+
+        params.append(limit)
+
+        sql: str = self.__statements.get(
+            ("search_students", table_name, len(indexed), len(scanned)), build
+        )
+        cursor, timer = self._query(sql, params)
+
+        return list(self._iter_student_rows(cursor, limit, timer))
+
+    def _build_search_index(self, table_name: str, entry: CatalogEntry) -> None:
+        """Builds the full-text index of a students table in one transaction.
+
+        Args:
+            table_name (str): Name of the students table to index, which may be
+                the staging table of `entry`.
+            entry (CatalogEntry): Dataset the index belongs to.
+        """
+        conn: sqlite3.Connection = self.get_connection()
+
+        try:
+            conn.execute("BEGIN")
+            self._create_search_index(conn, table_name, entry)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _create_search_index(
+        self, conn: sqlite3.Connection, table_name: str, entry: CatalogEntry
+    ) -> None:
+        """Creates the full-text index of a students table, without committing.
+
+        Creates an FTS5 table with the trigram tokenizer over the name, email,
+        major and student ID of every student, so any part of them can be
+        looked up, plus triggers that keep it in step with later inserts,
+        updates and deletes. The FTS5 table only stores the index, and reads
+        the students from their table.
+
+        Args:
+            conn (sqlite3.Connection): Connection inside a transaction.
+            table_name (str): Name of the students table to index, which may be
+                the staging table of `entry`.
+            entry (CatalogEntry): Dataset the index belongs to.
+        """
+        table: str = self._quote(table_name)
+        search_name: str = self.__catalog.search_name(entry)
+        search: str = self._quote(search_name)
+        columns: str = ", ".join(self.__search_columns)
+        new: str = ", ".join(f"new.{column}" for column in self.__search_columns)
+        old: str = ", ".join(f"old.{column}" for column in self.__search_columns)
+        # The staging table is renamed to the entry's table before the index is read
+        content: str = "'" + entry.table_name.replace("'", "''") + "'"
+        delete: str = (
+            f"INSERT INTO {search}({search}, rowid, {columns}) "
+            f"VALUES ('delete', old.rowid, {old});"
+        )
+        insert: str = f"INSERT INTO {search}(rowid, {columns}) VALUES (new.rowid, {new});"
+
+        conn.execute(f"DROP TABLE IF EXISTS {search}")
+        conn.execute(
+            f"CREATE VIRTUAL TABLE {search} USING fts5({columns}, "
+            f"content={content}, content_rowid='rowid', tokenize='trigram')"
+        )
+        conn.execute(
+            f"INSERT INTO {search}(rowid, {columns}) "
+            f"SELECT rowid, {columns} FROM {table}"
+        )
+        conn.execute(
+            f"CREATE TRIGGER {self._quote(search_name + '_insert')} "
+            f"AFTER INSERT ON {table} BEGIN {insert} END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER {self._quote(search_name + '_delete')} "
+            f"AFTER DELETE ON {table} BEGIN {delete} END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER {self._quote(search_name + '_update')} "
+            f"AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END"
+        )
+
+    def evaluate_all_awards(
+        self, batch_size: int = 1000
+    ) -> dict[str, list[StudentRecord]]:
+        """Evaluates every award criteria in a single scan.
+
+        Reads the students table once, testing every student against every
+        award in the same pass, then ranks and limits each award's matches.
+        Awards with a limit only keep their best candidates while scanning.
+        Students that tie on an award's sort are ordered by `student_ID`.
+
+        Args:
+            batch_size (int, optional): Number of rows fetched at a time. Defaults to 1000.
+        Returns:
+            A dict from award name to its ranked, limited recipients.
+        Raises:
+            InvalidCriteriaError: If any criteria uses unknown fields or operators.
+        """
+        records: list[AwardCriteriaRecord] = self.select_all_award_criteria()
+
+        if not records:
+            return {}
+
+        sql, params, orderings = self.__compiler.compile_evaluation(
+            self.students_table_name, records
+        )
+        width: int = len(self.__students_table_columns)
+        keys: list[Callable[[tuple], tuple]] = [
+            self._ranking_key(sort) for sort, _ in orderings
+        ]
+        candidates: list[list[tuple[tuple, tuple]]] = [[] for _ in records]
+
+        cursor, timer = self._query(sql, params)
+        fetched: int = 0
+
+        # After the student's columns comes one match flag per award
+        while rows := cursor.fetchmany(batch_size):
+            fetched += len(rows)
+
+            for row in rows:
+                flags: tuple = row[width:]
+
+                if not any(flags):
+                    continue
+
+                student: tuple = row[:width]
+
+                for i, flag in enumerate(flags):
+                    if flag:
+                        candidates[i].append((keys[i](student), student))
+
+            # Keep only the best candidates of limited awards
+            for i, (_, limit) in enumerate(orderings):
+                if limit and len(candidates[i]) > max(2 * limit, batch_size):
+                    candidates[i] = heapq.nsmallest(
+                        limit, candidates[i], key=lambda item: item[0]
+                    )
+
+        if timer is not None:
+            timer.finish(fetched)
+
+        results: dict[str, list[StudentRecord]] = {}
+
+        for record, (_, limit), ranked in zip(records, orderings, candidates):
+            ranked.sort(key=lambda item: item[0])
+            results[record.name] = [
+                StudentRecord(*student) for _, student in ranked[: limit or None]
+            ]
+
+        return results
+
+    def select_top_students_by_group(
+        self,
+        record: AwardCriteriaRecord,
+        partition_by: Iterable[str] = ("classification", "gender"),
+    ) -> dict[tuple, list[StudentRecord]]:
+        """Gets the top student records of every group.
+
+        Splits the students matching the criteria into groups that share the
+        values of `partition_by`, and returns the best `record.limit` students
+        of every group, ranked by `record.sort`, in a single statement using
+        `ROW_NUMBER() OVER (PARTITION BY ...)`. A limit of 0 returns every
+        matching student of every group. The result is cached until the
+        student data changes.
+
+        Args:
+            record (AwardCriteriaRecord): Scholarship criteria, whose limit applies to each group.
+            partition_by (Iterable[str], optional): Fields whose values form the groups.
+                Defaults to ("classification", "gender").
+        Returns:
+            A dict from the values of `partition_by` of each group to its ranked StudentRecords.
+        Raises:
+            InvalidCriteriaError: If the criteria or partition uses unknown fields or operators.
+        """
+        partition: tuple[str, ...] = tuple(partition_by)
+        sql, params = self.__compiler.compile_top_by_group(
+            self.students_table_name, record, partition
+        )
+        key: tuple = (self.__dataset_version, sql, params)
+        student_records: list[StudentRecord] | None = self.__results.get(key)
+
+        # If not cached, rank every group in one statement
+        if student_records is None:
+            width: int = len(self.__students_table_columns)
+            cursor, timer = self._query(sql, params)
+            rows: list[tuple] = cursor.fetchall()
+
+            if timer is not None:
+                timer.finish(len(rows))
+            # Each row ends with its rank in its group
+            student_records = [StudentRecord(*row[:width]) for row in rows]
+            self.__results.put(key, student_records)
+
+        # NOCASE columns group values that differ only in ASCII case, and rows
+        # arrive ordered by group, so a group ends where its folded values change
+        folds: list[bool] = [
+            "NOCASE" in column.type
+            for field in partition
+            for column in self.__students_table_columns
+            if column.name == field
+        ]
+        groups: dict[tuple, list[StudentRecord]] = {}
+        members: list[StudentRecord] = []
+        previous: tuple | None = None
+
+        for student in student_records:
+            values: tuple = tuple(getattr(student, field) for field in partition)
+            folded: tuple = tuple(
+                value.translate(_ASCII_LOWERCASE)
+                if fold and isinstance(value, str)
+                else value
+                for fold, value in zip(folds, values)
+            )
+
+            if folded != previous:
+                members = groups.setdefault(values, [])
+                previous = folded
+
+            members.append(student)
+
+        return groups
+
+    @classmethod
+    def _ranking_key(
+        cls, sort: tuple[tuple[str, Order], ...]
+    ) -> Callable[[tuple], tuple]:
+        """Returns a sort key for student rows that follows SQLite's ORDER BY.
+
+        SQLite sorts NULLs first when ascending and last when descending, and
+        `COLLATE NOCASE` only folds ASCII letters. Rows that tie on every sort
+        field are ordered by `student_ID`. Numeric columns hold numbers or
+        NULL, since imports validate them.
+
+        Args:
+            sort (tuple[tuple[str, Order], ...]): Fields and their order.
+        Returns:
+            A function from a student row to its sort key.
+        """
+        columns: dict[str, tuple[int, Column]] = {
+            column.name: (i, column)
+            for i, column in enumerate(cls.__students_table_columns)
+        }
+        parts: list[Callable[[tuple], Any]] = []
+
+        for field, order in sort:
+            i, column = columns[field]
+            descending: bool = order == Order.desc
+
+            if column.type.startswith(("REAL", "INTEGER")):
+                # Negating numbers reverses their order, NULL goes last
+                parts.append(
+                    (lambda row, i=i: (1, 0) if row[i] is None else (0, -row[i]))
+                    if descending
+                    else (lambda row, i=i: (0, 0) if row[i] is None else (1, row[i]))
+                )
+                continue
+
+            fold: bool = "NOCASE" in column.type
+
+            def text_key(row: tuple, i: int = i, fold: bool = fold) -> tuple:
+                value: Any = row[i]
+                if value is None:
+                    return 0, ""
+                return 1, str(value).translate(_ASCII_LOWERCASE) if fold else str(value)
+
+            parts.append(
+                (lambda row, text_key=text_key: _Descending(text_key(row)))
+                if descending
+                else text_key
+            )
+
+        # student_ID is never NULL, so it is compared directly
+        student_ID: int = columns["student_ID"][0]
+
+        # Unrolled for the usual one or two sort fields
+        if len(parts) == 1:
+            (first,) = parts
+            return lambda row: (first(row), row[student_ID])
+        if len(parts) == 2:
+            first, second = parts
+            return lambda row: (first(row), second(row), row[student_ID])
+
+        return lambda row: (*(part(row) for part in parts), row[student_ID])
+
+    def update_indexes(self) -> dict[str, str]:
+        """Creates and maintains the indexes advised by the award criteria.
+
+        Reads every award criteria and creates the composite indexes that
+        serve them on the students table in usage, dropping managed indexes
+        that are no longer needed. Awards with invalid criteria are skipped.
+
+        Returns:
+            A dict from award name to the name of the index built for it.
+        """
+        if not self.students_table_name:
+            return {}
+
+        return self._apply_indexes(self.students_table_name)
+
+    def _apply_indexes(
+        self, table_name: str, index_table: str | None = None
+    ) -> dict[str, str]:
+        """Creates and maintains the indexes advised by the award criteria on a table.
+
+        Args:
+            table_name (str): Name of the students table.
+            index_table (str | None, optional): Name of the table the index names
+                are derived from, when `table_name` is a staging table. Defaults to `table_name`.
+        Returns:
+            A dict from award name to the name of the index built for it.
+        """
+        if not self.table_exists(table_name) or not self.table_exists(
+            self.__award_criteria_table_name
+        ):
+            return {}
+
+        records: list[AwardCriteriaRecord] = []
+
+        for record in self.select_all_award_criteria():
+            try:
+                self.__compiler.validate(record)
+            except InvalidCriteriaError:
+                continue
+            records.append(record)
+
+        return self.__index_advisor.apply(
+            self.get_connection(), table_name, records, index_table
+        )
+
+    def index_report(self) -> dict[str, list[str]]:
+        """Reports which index each award uses.
+
+        Asks SQLite for the query plan of every award's query on the students
+        table in usage and collects the indexes it uses.
+
+        Returns:
+            A dict from award name to the indexes used, empty for a full scan.
+        """
+        report: dict[str, list[str]] = {}
+
+        if not self.students_table_name:
+            return report
+
+        for record in self.select_all_award_criteria():
+            try:
+                sql, params = self.__compiler.compile(self.students_table_name, record)
+            except InvalidCriteriaError:
+                continue
+            report[record.name] = self.__index_advisor.indexes_used(
+                self.get_connection(), sql, params
+            )
+
+        return report
+
+    def student_csv_to_table(self, file_path: str) -> ImportStatistics:
+        """Gets student records from CSV and stores in the table.
+
+        Reads in student records from a CSV file and stores them in a table
+        of their own, recorded in the dataset catalog by the file's path,
+        size, modification time and content hash. If the catalog holds a
+        table with the same contents, that table is reused without parsing
+        the file.
+
+        Otherwise the rows are imported into a staging table and the indexes
+        advised by the award criteria are built on it, then the staging table
+        is renamed into place in a single transaction. Until then the file in
+        usage stays open and queryable, and if the import fails it stays
+        open, untouched. The import runs under the `bulk-load` storage
+        profile. Afterwards the least recently used tables are
+        dropped if the catalog exceeds its disk budget.
+
+        Args:
+            file_path (str): File path for the CSV file.
+        Returns:
+            ImportStatistics describing the number of rows and throughput.
+        Raises:
+            FileIsOpenError: If the file is already open.
+        """
+        if self.file_is_open(file_path):
+            raise FileIsOpenError(f"File '{file_path}' is already open.")
+
+        start: float = time.perf_counter()
+        conn: sqlite3.Connection = self.get_connection()
+        entry, fingerprint = self.__catalog.match(conn, file_path)
+
+        # If the same contents were imported before, reuse their table
+        if entry is not None and self.table_exists(entry.table_name):
+            self._open_dataset(entry)
+            self.update_indexes()
+
+            return ImportStatistics(
+                file_path, entry.row_count, time.perf_counter() - start, reused=True
+            )
+
+        # If the table of a matching entry is gone, forget the entry
+        if entry is not None:
+            self.__catalog.remove(conn, entry)
+
+        entry = self.__catalog.reserve(conn, fingerprint)
+        staging: str = self.__catalog.staging_name(entry)
+
+        try:
+            with self.bulk_load():
+                entry.row_count = self.bulk_insert_students(
+                    staging, iter_student_rows_from_csv(file_path)
+                )
+                # Index names follow the table the staging table becomes
+                self._apply_indexes(staging, entry.table_name)
+                self._build_search_index(staging, entry)
+                self.__catalog.swap(conn, entry)
+        except BaseException:
+            self.__catalog.remove(conn, entry)
+            raise
+
+        self._open_dataset(entry)
+
+        entry.disk_bytes = self.__catalog.measure(conn, entry)
+        self.__catalog.update(conn, entry)
+
+        for evicted in self.__catalog.evict(conn, {entry.table_name}):
+            self.__maintenance.forget(evicted.table_name)
+
+        self._maintain_after_import(entry.table_name, entry.row_count)
+
+        return ImportStatistics(file_path, entry.row_count, time.perf_counter() - start)
+
+    def _has_derived_columns(self, table_name: str) -> bool:
+        """Returns whether a students table has every derived column.
+
+        Args:
+            table_name (str): Name of the students table.
+        Returns:
+            True if the table has the derived columns, else False.
+        """
+        cursor: sqlite3.Cursor = self.get_connection().execute(
+            f"PRAGMA table_xinfo({self._quote(table_name)})"
+        )
+        names: set[str] = {row[1] for row in cursor}
+
+        return all(column.name in names for column in self.__derived_columns)
+
+    def _open_dataset(self, entry: CatalogEntry) -> None:
+        """Makes the table of a cataloged dataset the students table in usage.
+
+        Args:
+            entry (CatalogEntry): Dataset to use.
+        """
+        self.students_table_name = entry.table_name
+        self.students_file_path = entry.path
+        self.__dataset = entry
+
+    def refresh_students_from_csv(self, file_path: str) -> RefreshSummary:
+        """Refreshes the students table from an updated CSV file.
+
+        Compares the student records in the CSV file with the loaded table by
+        `student_ID`, and applies only the inserts, updates and deletes needed
+        to match the file, in a single transaction. Indexes are kept, and
+        cached query results are kept if nothing changed. A file whose
+        fingerprint has not changed is not read at all. If the file is not
+        open, it is opened with `student_csv_to_table` instead. Changes are
+        applied under the `bulk-load` storage profile.
+
+        Args:
+            file_path (str): File path for the CSV file.
+        Returns:
+            RefreshSummary counting the inserted, updated, deleted and unchanged students.
+        """
+        if not self.file_is_open(file_path):
+            statistics: ImportStatistics = self.student_csv_to_table(file_path)
+            inserted: int = 0 if statistics.reused else statistics.rows
+
+            return RefreshSummary(
+                file_path, inserted, 0, 0, statistics.rows - inserted, statistics.seconds
+            )
+
+        start: float = time.perf_counter()
+        conn: sqlite3.Connection = self.get_connection()
+        dataset: CatalogEntry = self.__dataset
+        entry, fingerprint = self.__catalog.match(conn, file_path)
+
+        # If the file still matches the open table, there is nothing to apply
+        if entry is not None and entry.table_id == dataset.table_id:
+            self.__dataset = entry
+
+            return RefreshSummary(
+                file_path, 0, 0, 0, entry.row_count, time.perf_counter() - start
+            )
+
+        with self.bulk_load():
+            inserted, updated, deleted, unchanged = self.merge_students(
+                self.students_table_name, iter_student_rows_from_csv(file_path)
+            )
+            self.update_indexes()
+
+        # The open table now holds the file's current contents
+        dataset.size = fingerprint.size
+        dataset.mtime_ns = fingerprint.mtime_ns
+        dataset.content_hash = fingerprint.content_hash
+        dataset.row_count = inserted + updated + unchanged
+        dataset.disk_bytes = self.__catalog.measure(conn, dataset)
+        self.__catalog.touch(conn, dataset)
+        self._maintain_after_import(dataset.table_name, inserted + updated + deleted)
+
+        return RefreshSummary(
+            file_path, inserted, updated, deleted, unchanged, time.perf_counter() - start
+        )
+
+    def merge_students(
+        self, table_name: str, rows: Iterable[tuple]
+    ) -> tuple[int, int, int, int]:
+        """Makes a students table match a set of rows in one transaction.
+
+        Loads the rows into a temporary table, then deletes the students whose
+        `student_ID` is missing from the rows, updates the students whose
+        values differ, and inserts the new ones. Values are compared exactly,
+        so a change in letter case counts as an update. If any row is
+        malformed or rejected by SQLite, the whole transaction is rolled back.
+
+        Args:
+            table_name (str): Name of the students table, created if it does not exist.
+            rows (Iterable[tuple]): Rows in the same column order as `StudentRecord`.
+        Returns:
+            A tuple of the number of students inserted, updated, deleted and unchanged.
+        """
+        staging: str = "scholarly_merge"
+        table: str = self._quote(table_name)
+        names: list[str] = [self._quote(column.name) for column in self.__students_columns]
+        key: str = self._quote("student_ID")
+        values: list[str] = [name for name in names if name != key]
+
+        create_query: Query = (
+            Query.create_table(table_name)
+            .columns(*self.__students_table_columns)
+            .if_not_exists()
+        )
+        staging_query: Query = (
+            Query.create_table(staging).temporary().columns(*self.__students_columns)
+        )
+        load_query: Query = Query.into(Table(staging)).insert(
+            *[Parameter("?")] * len(self.__students_columns)
+        )
+        delete_sql: str = (
+            f"DELETE FROM {table} WHERE {key} NOT IN (SELECT {key} FROM temp.{staging})"
+        )
+        # COLLATE BINARY on the new value overrides NOCASE columns
+        update_sql: str = (
+            f"UPDATE {table} SET "
+            + ", ".join(f"{name} = new.{name}" for name in values)
+            + f" FROM temp.{staging} AS new WHERE {table}.{key} = new.{key} AND ("
+            + " OR ".join(f"{table}.{name} IS NOT new.{name} COLLATE BINARY" for name in values)
+            + ")"
+        )
+        insert_sql: str = (
+            f"INSERT INTO {table} ({', '.join(names)}) "
+            f"SELECT {', '.join(names)} FROM temp.{staging} "
+            f"WHERE {key} NOT IN (SELECT {key} FROM {table})"
+        )
+        validated_rows: Iterator[tuple] = (
+            self._validate_student_row(row, row_number)
+            for row_number, row in enumerate(rows, start=1)
+        )
+
+        conn: sqlite3.Connection = self.get_connection()
+        cursor: sqlite3.Cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute(str(create_query))
+            cursor.execute(str(staging_query))
+            cursor.executemany(str(load_query), validated_rows)
+            loaded: int = cursor.execute(f"SELECT COUNT(*) FROM temp.{staging}").fetchone()[0]
+            deleted: int = cursor.execute(delete_sql).rowcount
+            updated: int = cursor.execute(update_sql).rowcount
+            inserted: int = cursor.execute(insert_sql).rowcount
+            cursor.execute(f"DROP TABLE temp.{staging}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        # If any student changed, cached results are stale
+        if inserted or updated or deleted:
+            self._bump_dataset_version()
+
+        return inserted, updated, deleted, loaded - inserted - updated
+
+    @staticmethod
+    def _quote(identifier: str) -> str:
+        """Returns `identifier` quoted for use in SQL."""
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def bulk_insert_students(self, table_name: str, rows: Iterable[tuple]) -> int:
+        """Creates a students table and fills it in one transaction.
+
+        Creates the table `table_name` if it does not exist, then inserts
+        every row with `executemany`. If any row is malformed or rejected by
+        SQLite, the whole transaction is rolled back.
+
+        Args:
+            table_name (str): Name of the students table.
+            rows (Iterable[tuple]): Rows in the same column order as `StudentRecord`.
+        Returns:
+            The number of rows inserted.
+        """
+        create_query: Query = (
+            Query.create_table(table_name)
+            .columns(*self.__students_table_columns)
+            .if_not_exists()
+        )
+        insert_query: Query = Query.into(Table(table_name)).insert(
+            *[Parameter("?")] * len(self.__students_columns)
+        )
+        validated_rows: Iterator[tuple] = (
+            self._validate_student_row(row, row_number)
+            for row_number, row in enumerate(rows, start=1)
+        )
+
+        conn: sqlite3.Connection = self.get_connection()
+        cursor: sqlite3.Cursor = conn.cursor()
+
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute(str(create_query))
+            cursor.executemany(str(insert_query), validated_rows)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        # Only a committed import changes what queries return
+        self._bump_dataset_version()
+
+        return cursor.rowcount
+
+    @classmethod
+    def _validate_student_row(cls, row: tuple, row_number: int) -> tuple:
+        """Validates and normalizes a row of student data.
+
+        Args:
+            row (tuple): Column values in the same order as `StudentRecord`.
+            row_number (int): Number of the data row, used in error messages.
+        Returns:
+            The row with missing values as `None` and numeric columns coerced.
+        Raises:
+            MalformedRowError: If the row cannot be stored in the students table.
+        """
+        if len(row) != len(cls.__students_columns):
+            raise MalformedRowError(
+                f"Row {row_number}: expected {len(cls.__students_columns)} values, got {len(row)}."
+            )
+
+        # Missing cells are read as NaN
+        values: list = [
+            None if isinstance(value, float) and math.isnan(value) else value
+            for value in row
+        ]
+        name, student_ID, cum_gpa, _, _, earned_credits, *_ = values
+
+        if not name or not student_ID:
+            raise MalformedRowError(f"Row {row_number}: name and student_ID are required.")
+
+        try:
+            values[1] = str(student_ID)
+            values[2] = None if cum_gpa is None else float(cum_gpa)
+            values[5] = None if earned_credits is None else int(earned_credits)
+        except (TypeError, ValueError) as e:
+            raise MalformedRowError(f"Row {row_number}: {e}") from e
+
+        return tuple(values)
+
+    def award_criteria_json_to_table(self, file_path: str) -> int:
+        """Convienience function for populating table.
+
+        Function to assist with populating award criteria table. Every
+        award in the file is validated, then inserted or, if an award with
+        the same name exists, updated, in a single transaction.
+
+        Args:
+            file_path (str): File path to JSON file, in the format of `scholarships.json`.
+        Returns:
+            The number of awards inserted or updated.
+        Raises:
+            InvalidCriteriaError: If any award is malformed or uses unknown fields or operators.
+        """
+        with open(file_path, "r") as file:
+            data: Any = json.load(file)
+
+        if not isinstance(data, list):
+            raise InvalidCriteriaError(f"{file_path}: expected a list of awards.")
+
+        records: list[AwardCriteriaRecord] = []
+
+        for number, item in enumerate(data, start=1):
+            try:
+                records.append(AwardCriteriaRecord(**item))
+            except TypeError as e:
+                raise InvalidCriteriaError(f"Award {number}: {e}") from e
+
+        return self.upsert_award_criteria(records)
+
+    def upsert_award_criteria(self, records: Iterable[AwardCriteriaRecord]) -> int:
+        """Inserts or updates award criteria in one transaction.
+
+        Validates every record first, so an invalid record leaves the table
+        unchanged, then inserts each award or, if an award with the same
+        name exists, replaces its criteria, limit and sort.
+
+        Args:
+            records (Iterable[AwardCriteriaRecord]): Award criteria.
+        Returns:
+            The number of awards inserted or updated.
+        Raises:
+            InvalidCriteriaError: If any name is not a non-empty string, or any
+                criteria uses unknown fields or operators.
+        """
+        records = list(records)
+
+        for record in records:
+            self.__compiler.validate(record)
+
+        table_name: str = self.__award_criteria_table_name
+        names: list[str] = [column.name for column in self.__award_criteria_columns]
+
+        def build() -> str:
+            insert: Query = (
+                Query.into(table_name)
+                .columns(*names)
+                .insert(*[Parameter("?")] * len(names))
+            )
+            updates: str = ", ".join(
+                f'"{name}" = excluded."{name}"' for name in names[1:]
+            )
+            return f'{insert} ON CONFLICT ("name") DO UPDATE SET {updates}'
+
+        sql: str = self.__statements.get(("upsert_award_criteria",), build)
+
+        with self.transaction() as conn:
+            self.create_table(table_name, self.__award_criteria_columns)
+            conn.executemany(
+                sql,
+                (
+                    (
+                        record.name,
+                        json.dumps(record.criteria),
+                        record.limit,
+                        json.dumps(record.sort),
+                    )
+                    for record in records
+                ),
+            )
+
+            for record in records:
+                self.__compiler.invalidate(record.name)
+                self._stage_award_criteria("put", record.name, record)
+
+            self._after_commit(self.update_indexes)
+
+        return len(records)
+
+    def award_criteria_table_to_json(self, file_path: str) -> int:
+        """Exports every award criteria to a JSON file.
+
+        Writes the awards in the format of `scholarships.json`, one at a time
+        as they are read, to a temporary file that then replaces `file_path`.
+
+        Args:
+            file_path (str): File path to JSON file.
+        Returns:
+            The number of awards exported.
+        """
+        cursor: sqlite3.Cursor = self._execute(
+            ("select_all_award_criteria",),
+            lambda: Query.from_(self.__award_criteria_table_name)
+            .select("*")
+            .orderby("name", order=Order.asc),
+        )
+        temporary_path: str = f"{file_path}.tmp"
+        count: int = 0
+
+        try:
+            with open(temporary_path, "w") as file:
+                file.write("[")
+
+                for name, criteria, limit, sort in cursor:
+                    record: AwardCriteriaRecord = AwardCriteriaRecord(
+                        name, json.loads(criteria), limit, json.loads(sort)
+                    )
+                    file.write(",\n" if count else "\n")
+                    file.write(textwrap.indent(json.dumps(record.to_dict(), indent=4), "    "))
+                    count += 1
+
+                file.write("\n]\n" if count else "]\n")
+
+            os.replace(temporary_path, file_path)
+        finally:
+            cursor.close()
+
+            # If writing failed, do not leave the partial file behind
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+        return count
+
+    def select_all_award_criteria(self) -> list[AwardCriteriaRecord]:
+        """Returns all award criteria.
+
+        Returns all award criteria in the table, sorted by name. Served from
+        the parsed award criteria kept in memory; the records are shared, so
+        they must not be modified.
+
+        Returns:
+            A list of AwardCriteriaRecord.
+        """
+        return list(self._award_criteria().values())
+
+    def add_award_criteria_listener(
+        self, listener: Callable[[list[AwardCriteriaRecord]], Any]
+    ) -> None:
+        """Calls a function whenever the award criteria change.
+
+        The listener is called with every award criteria, sorted by name,
+        on the thread that made the change, once the change is committed.
+        Changes made inside `transaction` are announced once, after it commits.
+
+        Args:
+            listener (Callable[[list[AwardCriteriaRecord]], Any]): Function to call.
+        """
+        with self.__award_criteria_lock:
+            self.__award_criteria_listeners.append(listener)
+
+    def remove_award_criteria_listener(
+        self, listener: Callable[[list[AwardCriteriaRecord]], Any]
+    ) -> None:
+        """Stops calling a function added with `add_award_criteria_listener`.
+
+        Args:
+            listener (Callable[[list[AwardCriteriaRecord]], Any]): Function to stop calling.
+        """
+        with self.__award_criteria_lock:
+            if listener in self.__award_criteria_listeners:
+                self.__award_criteria_listeners.remove(listener)
+
+    def _award_criteria(self) -> dict[str, AwardCriteriaRecord]:
+        """Returns the parsed award criteria, loading them on first use.
+
+        Inside a `transaction` block that changed the award criteria, they are
+        read from the connection instead, so the block sees its own writes.
+
+        Returns:
+            A dict of AwardCriteriaRecord keyed by lowercase name, sorted by name.
+        """
+        # If this thread's transaction has pending changes, the cache is behind it
+        if getattr(self.__transactions, "depth", 0) and getattr(
+            self.__transactions, "award_criteria_changes", None
+        ):
+            return self._load_award_criteria()
+
+        with self.__award_criteria_lock:
+            if self.__award_criteria is not None:
+                return self.__award_criteria
+
+            records: dict[str, AwardCriteriaRecord] = self._load_award_criteria()
+
+            # Uncommitted rows read inside a transaction could still be rolled back
+            if not getattr(self.__transactions, "depth", 0):
+                self.__award_criteria = records
+
+            return records
+
+    def _stage_award_criteria(
+        self, change: str, name: str = "", record: AwardCriteriaRecord | None = None
+    ) -> None:
+        """Records a committed or pending change to the award criteria.
+
+        The change is applied to the award criteria in memory, and the
+        listeners called, once the write commits.
+
+        Args:
+            change (str): "put" to insert or replace, "update" to replace an
+                existing award, "remove" to delete it, or "clear" to delete all.
+            name (str, optional): Name of the award. Defaults to "".
+            record (AwardCriteriaRecord | None, optional): New value of the award. Defaults to None.
+        """
+        changes: list[tuple] | None = getattr(
+            self.__transactions, "award_criteria_changes", None
+        )
+
+        if changes is None:
+            changes = self.__transactions.award_criteria_changes = []
+
+        changes.append((change, name.translate(_ASCII_LOWERCASE), record))
+        self._after_commit(self._publish_award_criteria)
+
+    def _publish_award_criteria(self) -> None:
+        """Applies the calling thread's committed changes and notifies listeners."""
+        changes: list[tuple] = self.__transactions.award_criteria_changes
+        self.__transactions.award_criteria_changes = []
+
+        if not changes:
+            return
+
+        with self.__award_criteria_lock:
+            records: dict[str, AwardCriteriaRecord] | None = self.__award_criteria
+
+            # If loaded, apply the changes rather than parsing every row again
+            if records is not None:
+                resort: bool = False
+
+                for change, key, record in changes:
+                    existing: AwardCriteriaRecord | None = records.get(key)
+
+                    if change == "clear":
+                        records.clear()
+                    elif change == "remove":
+                        records.pop(key, None)
+                    elif existing is not None:
+                        # The table keeps the name as first inserted
+                        records[key] = AwardCriteriaRecord(
+                            existing.name, record.criteria, record.limit, record.sort
+                        )
+                    elif change == "put":
+                        records[key] = record
+                        resort = True
+
+                if resort:
+                    self.__award_criteria = dict(sorted(records.items()))
+
+            listeners: list[Callable] = list(self.__award_criteria_listeners)
+
+        if listeners:
+            award_records: list[AwardCriteriaRecord] = self.select_all_award_criteria()
+
+            for listener in listeners:
+                listener(award_records)
+
+    def _load_award_criteria(self) -> dict[str, AwardCriteriaRecord]:
+        """Reads and parses every award criteria from the table.
+
+        Returns:
+            A dict of AwardCriteriaRecord keyed by lowercase name, sorted by name.
+        """
+        cursor: sqlite3.Cursor = self._execute(
+            ("select_all_award_criteria",),
+            lambda: Query.from_(self.__award_criteria_table_name)
+            .select("*")
+            .orderby("name", order=Order.asc),
+        )
+
+        data: list = cursor.fetchall()
+
+        award_records: dict[str, AwardCriteriaRecord] = {}
+
+        for name, criteria, limit, sort in data:
+            award_records[name.translate(_ASCII_LOWERCASE)] = AwardCriteriaRecord(
+                name, json.loads(criteria), limit, json.loads(sort)
             )
         return award_records
 
@@ -479,9 +2561,7 @@ if __name__ == "__main__":
     db = ScholarlyDatabase("database/scholarly.sqlite")
 
     db.drop_table(ScholarlyDatabase.get_award_criteria_table_name())
-    db.set_students_table_name("example_data/student_data2.csv")
-    db.drop_table(db.get_students_table_name())
-    db.student_csv_to_table("example_data/student_data2.csv")
+    print(db.student_csv_to_table("example_data/student_data2.csv"))
     db.create_table(
         ScholarlyDatabase.get_award_criteria_table_name(),
         ScholarlyDatabase.get_award_criteria_columns(),
@@ -490,7 +2570,10 @@ if __name__ == "__main__":
     db.award_criteria_json_to_table("scholarships.json")
     c = db.select_award_criteria("Colleen and Richard Simpson")
     print(c)
+    print(db.index_report())
     stud = db.select_students_by_criteria(c)
     print(stud)
+    print(db.select_all_datasets())
 
-    db.drop_table(db.get_students_table_name())
+    db.close_students_file()
+    db.close()
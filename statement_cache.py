@@ -0,0 +1,73 @@
+"""Provides a class for caching rendered SQL statements.
+
+Provides the class `StatementCache`, a bounded least recently used (LRU)
+cache of SQL templates keyed by query shape. Templates use `?` placeholders,
+so the values are passed separately as parameters and the same SQL text,
+and SQLite's compiled statement, are reused for every call of the same shape.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class StatementCache:
+    """Bounded LRU cache of SQL templates.
+
+    Class for storing SQL templates keyed by the shape of the query that
+    produced them, evicting the least recently used template when full.
+    """
+
+    def __init__(self, max_size: int = 128) -> None:
+        """Creates an instance of StatementCache.
+
+        Args:
+            max_size (int, optional): Maximum number of templates kept. Defaults to 128.
+        """
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__statements: OrderedDict[Hashable, str] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def get(self, shape: Hashable, build: Callable[[], str]) -> str:
+        """Returns the SQL template for a query shape.
+
+        Returns the cached SQL template for `shape`, calling `build` to render
+        it on a cache miss.
+
+        Args:
+            shape (Hashable): Key describing the query, without any values.
+            build (Callable[[], str]): Function that renders the SQL template.
+        Returns:
+            The SQL template as a `str`.
+        """
+        with self.__lock:
+            sql: str | None = self.__statements.get(shape)
+
+            if sql is not None:
+                self.hits += 1
+                self.__statements.move_to_end(shape)
+                return sql
+
+        sql = build()
+
+        with self.__lock:
+            self.misses += 1
+            self.__statements[shape] = sql
+            self.__statements.move_to_end(shape)
+
+            # Evict least recently used templates
+            while len(self.__statements) > self.max_size:
+                self.__statements.popitem(last=False)
+
+        return sql
+
+    def clear(self) -> None:
+        """Removes every cached template."""
+        with self.__lock:
+            self.__statements.clear()
+
+    def __len__(self) -> int:
+        """Returns the number of cached templates."""
+        return len(self.__statements)
@@ -0,0 +1,240 @@
+"""Provides a class for tuning how SQLite stores the database.
+
+Provides the class `StorageProfile`, a named set of PRAGMAs (journal mode,
+synchronous level, page cache size, memory mapping, temporary storage and,
+on new databases, page size) applied to every connection, and the profiles
+`safe`, `balanced` and `bulk-load`. Running this module benchmarks every
+profile.
+"""
+
+import sqlite3
+
+
+class UnknownStorageProfileError(Exception):
+    """Class for defining the "UnknownStorageProfile" exception."""
+
+    pass
+
+
+class StorageProfile:
+    """Represents a set of storage PRAGMAs.
+
+    Class for the settings that trade durability for speed. `journal_mode`
+    and `page_size` belong to the database file, the rest to each connection.
+    A setting of `None` leaves the current value as it is.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        journal_mode: str | None,
+        synchronous: str,
+        cache_size: int,
+        mmap_size: int,
+        temp_store: str,
+        page_size: int | None = 4096,
+    ) -> None:
+        """Creates an instance of StorageProfile.
+
+        Args:
+            name (str): Name of the profile.
+            journal_mode (str | None): Journal mode, such as "WAL" or "DELETE".
+            synchronous (str): When to sync to disk: "FULL", "NORMAL" or "OFF".
+            cache_size (int): Page cache size, in pages, or in KiB if negative.
+            mmap_size (int): Bytes of the database file to memory map, 0 for none.
+            temp_store (str): Where temporary tables and indexes live: "DEFAULT", "FILE" or "MEMORY".
+            page_size (int | None, optional): Page size in bytes, set on a new
+                database only. Defaults to 4096.
+        """
+        self.name: str = name
+        self.journal_mode: str | None = journal_mode
+        self.synchronous: str = synchronous
+        self.cache_size: int = cache_size
+        self.mmap_size: int = mmap_size
+        self.temp_store: str = temp_store
+        self.page_size: int | None = page_size
+
+    @classmethod
+    def get(cls, name: str) -> "StorageProfile":
+        """Returns a named profile.
+
+        Args:
+            name (str): One of "safe", "balanced" or "bulk-load".
+        Returns:
+            The StorageProfile.
+        Raises:
+            UnknownStorageProfileError: If there is no profile called `name`.
+        """
+        profile: StorageProfile | None = PROFILES.get(name)
+
+        if profile is None:
+            raise UnknownStorageProfileError(
+                f"Unknown storage profile '{name}', expected one of {', '.join(PROFILES)}."
+            )
+
+        return profile
+
+    def pragmas(
+        self, new_database: bool = False, journal_mode: str | None = None
+    ) -> list[str]:
+        """Returns the PRAGMA statements of the profile.
+
+        The page size is only set on a new database, where it comes first,
+        since it must be set before the journal mode to take effect. Not
+        syncing is only safe in WAL mode, where a crash can lose the last
+        commits but not corrupt the database, so in any other journal mode
+        "OFF" becomes "NORMAL".
+
+        Args:
+            new_database (bool, optional): Whether the database has no pages yet. Defaults to False.
+            journal_mode (str | None, optional): Current journal mode of the database, used
+                when the profile keeps it. Defaults to None.
+        Returns:
+            A list of PRAGMA statements.
+        """
+        pragmas: list[str] = []
+
+        if new_database and self.page_size is not None:
+            pragmas.append(f"PRAGMA page_size = {int(self.page_size)}")
+        if self.journal_mode is not None:
+            pragmas.append(f"PRAGMA journal_mode = {self.journal_mode}")
+            journal_mode = self.journal_mode
+
+        synchronous: str = self.synchronous
+
+        if synchronous.upper() == "OFF" and (journal_mode or "").upper() != "WAL":
+            synchronous = "NORMAL"
+
+        pragmas.extend(
+            [
+                f"PRAGMA synchronous = {synchronous}",
+                f"PRAGMA cache_size = {int(self.cache_size)}",
+                f"PRAGMA mmap_size = {int(self.mmap_size)}",
+                f"PRAGMA temp_store = {self.temp_store}",
+            ]
+        )
+
+        return pragmas
+
+    def apply(self, conn: sqlite3.Connection) -> None:
+        """Applies the profile to a connection.
+
+        Args:
+            conn (sqlite3.Connection): Connection outside of a transaction.
+        """
+        new_database: bool = False
+        journal_mode: str | None = None
+
+        # The page size only matters before the first page is written
+        if self.page_size is not None:
+            (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+            new_database = page_count == 0
+        if self.journal_mode is None:
+            (journal_mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+
+        for pragma in self.pragmas(new_database, journal_mode):
+            # journal_mode returns the resulting mode, which must be consumed
+            conn.execute(pragma).fetchall()
+
+    def __repr__(self) -> str:
+        """Returns a str representation.
+
+        Returns a str representation of the StorageProfile object.
+        """
+        return f"StorageProfile({self.name})"
+
+
+PROFILES: dict[str, StorageProfile] = {
+    # Rollback journal synced on every commit, like SQLite's defaults
+    "safe": StorageProfile("safe", "DELETE", "FULL", -2000, 0, "DEFAULT"),
+    # WAL only needs to sync at checkpoints to stay consistent after a crash
+    "balanced": StorageProfile(
+        "balanced", "WAL", "NORMAL", -64000, 256 * 1024 * 1024, "MEMORY"
+    ),
+    # Keeps the journal mode, so it can be switched on and off while other
+    # connections are open, and skips syncing for the duration of an import
+    # when the database is in WAL mode
+    "bulk-load": StorageProfile(
+        "bulk-load", None, "OFF", -256000, 256 * 1024 * 1024, "MEMORY"
+    ),
+}
+
+
+# Benchmark of every profile
+if __name__ == "__main__":
+    import os
+    import random
+    import shutil
+    import tempfile
+    import time
+    from rich import print
+    from scholarly_database import ScholarlyDatabase
+    from award_criteria_record import AwardCriteriaRecord
+    from student_record import StudentRecord
+
+    rows: int = 100000
+    commits: int = 500
+    students: list[tuple] = [
+        (
+            f"Last{i}, First{i}",
+            f"M{i:08d}",
+            round(random.uniform(0, 4), 2),
+            random.choice(["Computer Science", "Biology", "Psychology"]),
+            random.choice(["freshman", "sophomore", "junior", "senior", "graduate"]),
+            random.randint(0, 150),
+            random.choice(["yes", "no"]),
+            f"student{i}@example.edu",
+            random.choice(["male", "female"]),
+            random.choice(["yes", "no"]),
+        )
+        for i in range(rows)
+    ]
+    criteria: AwardCriteriaRecord = AwardCriteriaRecord(
+        "Benchmark", {"major": "Computer Science", "cum_gpa": {"$gte": 3.0}}, 0
+    )
+    directory: str = tempfile.mkdtemp()
+
+    try:
+        for name in PROFILES:
+            db: ScholarlyDatabase = ScholarlyDatabase(
+                os.path.join(directory, f"{name}.sqlite"),
+                storage_profile=name,
+                auto_maintenance=False,
+            )
+
+            # Insert in batches, committing each one like separate imports
+            start: float = time.perf_counter()
+            for batch in range(0, rows, 10000):
+                db.bulk_insert_students("students", students[batch : batch + 10000])
+            insert_seconds: float = time.perf_counter() - start
+
+            # The same batches inside bulk_load(), as imports run them
+            start = time.perf_counter()
+            with db.bulk_load():
+                for batch in range(0, rows, 10000):
+                    db.bulk_insert_students(
+                        "students_bulk", students[batch : batch + 10000]
+                    )
+            bulk_load_seconds: float = time.perf_counter() - start
+
+            # Insert one student per transaction, like edits made in the app
+            db.set_students_table_name("students")
+            start = time.perf_counter()
+            for i in range(commits):
+                db.insert_student(StudentRecord(f"New{i}, Student", f"N{i:08d}"))
+            commit_seconds: float = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(20):
+                list(db.iter_students_by_criteria(criteria))
+            query_seconds: float = (time.perf_counter() - start) / 20
+
+            print(
+                f"{name:>10}: {rows / insert_seconds:>10,.0f} rows/sec in bulk, "
+                f"{rows / bulk_load_seconds:>10,.0f} rows/sec in bulk_load(), "
+                f"{commits / commit_seconds:>8,.0f} commits/sec, "
+                f"{query_seconds * 1000:>6.1f} ms per query"
+            )
+            db.close()
+    finally:
+        shutil.rmtree(directory)
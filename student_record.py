@@ -4,6 +4,7 @@ Provides the class `StudentRecord` for storing student data and converting it
 into other data structures for ease of use in SQLite database.
 """
 
+from typing import Iterator
 import pandas as pd
 
 
@@ -25,10 +26,17 @@ class StudentRecord:
         email: str = "",
         gender: str = "",
         in_state: str = "",
+        first_name: str | None = None,
+        last_name: str | None = None,
+        display_name: str | None = None,
+        normalized_email: str | None = None,
+        gpa_band: float | None = None,
     ) -> None:
         """Creates a StudentRecord object.
 
-        A class for storing and representing student data.
+        A class for storing and representing student data. The fields after
+        `in_state` are derived by the database from the others when a student
+        is written, and are not part of the record's dict, tuple or list.
 
         Args:
             name (str): Name of the student.
@@ -40,6 +48,11 @@ class StudentRecord:
             enrolled (str): Enrollment status of the student ("Yes", "No").
             gender (str): Gender of the student.
             in_state (str): Whether or not the student is in state ("Yes", "No").
+            first_name (str | None): First name, None if `name` is not "last_name, first_name".
+            last_name (str | None): Last name, None if `name` is not "last_name, first_name".
+            display_name (str | None): "first_name last_name", or `name` if it does not split.
+            normalized_email (str | None): Email without surrounding whitespace, in lowercase.
+            gpa_band (float | None): Lower bound of the half point band of `cum_gpa`.
         """
         self.name: str = name
         self.student_ID: str = student_ID
@@ -51,6 +64,11 @@ class StudentRecord:
         self.email: str = email
         self.gender: str = gender
         self.in_state: bool = in_state
+        self.first_name: str | None = first_name
+        self.last_name: str | None = last_name
+        self.display_name: str | None = display_name
+        self.normalized_email: str | None = normalized_email
+        self.gpa_band: float | None = gpa_band
 
     def __iter__(self):
         """Allows for iterating over attributes.
@@ -141,6 +159,26 @@ def read_student_data_from_csv(file_path: str) -> list[StudentRecord]:
     return studentRecordList
 
 
+def iter_student_rows_from_csv(
+    file_path: str, chunk_size: int = 10000
+) -> Iterator[tuple]:
+    """Yields rows of student data from a CSV file.
+
+    Reads the CSV file in chunks of `chunk_size` rows and yields each row
+    as a tuple of column values, in the same order as `StudentRecord`,
+    without building a `StudentRecord` for every row.
+
+    Args:
+        file_path (str): File path for the CSV file.
+        chunk_size (int, optional): Number of rows parsed at a time. Defaults to 10000.
+
+    Returns:
+        An iterator of tuples, one per row in the CSV file.
+    """
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        yield from chunk.itertuples(index=False, name=None)
+
+
 def write_student_data_to_csv(
     file_path: str, student_data: list[StudentRecord]
 ) -> None:
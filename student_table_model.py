@@ -29,6 +29,8 @@ class StudentTableModel(QAbstractTableModel):
         """
         super(StudentTableModel, self).__init__()
         self.student_data: list[list] = None
+        # The records themselves keep the columns derived by the database
+        self.student_records: list[StudentRecord] = list(student_data)
 
         if student_data:
             self.student_data = [student.to_list() for student in student_data]
@@ -70,6 +72,11 @@ class StudentTableModel(QAbstractTableModel):
         if index.isValid():
             if role == Qt.ItemDataRole.EditRole:
                 self.student_data[index.row()][index.column()] = value
+                setattr(
+                    self.student_records[index.row()],
+                    self._col_headers[index.column()],
+                    value,
+                )
                 return True
         return False
 
@@ -125,9 +132,7 @@ class StudentTableModel(QAbstractTableModel):
         Returns:
             A list of StudentRecord.
         """
-        data: list[StudentRecord] = [
-            StudentRecord(*record) for record in self.student_data
-        ]
+        data: list[StudentRecord] = list(self.student_records)
         return data
 
     def get_row(self, row: int) -> StudentRecord:
@@ -140,7 +145,7 @@ class StudentTableModel(QAbstractTableModel):
         Returns:
             A StudentRecord.
         """
-        record: StudentRecord = StudentRecord(*self.student_data[row])
+        record: StudentRecord = self.student_records[row]
         return record
 
     def flags(self, index: QModelIndex) -> Qt.ItemFlag:
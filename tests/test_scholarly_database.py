@@ -0,0 +1,105 @@
+"""Tests for the transactions of `ScholarlyDatabase`."""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from award_criteria_record import AwardCriteriaRecord
+from scholarly_database import ScholarlyDatabase
+
+
+class TransactionTest(unittest.TestCase):
+    """Tests that failed writes do not leave the connection in a transaction."""
+
+    def setUp(self) -> None:
+        """Creates a database in a temporary directory."""
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.database: ScholarlyDatabase = ScholarlyDatabase(
+            os.path.join(self.directory.name, "scholarly.sqlite"),
+            auto_maintenance=False,
+        )
+        self.record: AwardCriteriaRecord = AwardCriteriaRecord(
+            "Dean's List", {"cum_gpa": {"$gte": 3.5}}, 0, [["cum_gpa", -1]]
+        )
+        self.database.insert_award_criteria(self.record)
+
+    def tearDown(self) -> None:
+        """Closes the database and removes its directory."""
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_failed_write_is_rolled_back(self) -> None:
+        """A failed write releases its implicit transaction."""
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.database.insert_award_criteria(self.record)
+
+        self.assertFalse(self.database.get_connection().in_transaction)
+
+    def test_transaction_after_failed_write(self) -> None:
+        """A transaction can start after a failed write."""
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.database.insert_award_criteria(self.record)
+
+        with self.database.transaction():
+            self.database.remove_award_criteria(self.record.name)
+
+        self.assertIsNone(self.database.select_award_criteria(self.record.name))
+
+    def test_other_connection_can_write_after_failed_write(self) -> None:
+        """A failed write does not keep holding the write lock."""
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.database.insert_award_criteria(self.record)
+
+        conn: sqlite3.Connection = sqlite3.connect(
+            self.database.database_path, timeout=0
+        )
+
+        try:
+            conn.execute("DELETE FROM award_criteria")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_transaction_rolls_back_on_error(self) -> None:
+        """Writes in a transaction that raises are rolled back together."""
+        with self.assertRaises(ValueError):
+            with self.database.transaction():
+                self.database.remove_award_criteria(self.record.name)
+                raise ValueError("Abort")
+
+        self.assertFalse(self.database.get_connection().in_transaction)
+        self.assertIsNotNone(self.database.select_award_criteria(self.record.name))
+
+    def test_transaction_reads_its_own_writes(self) -> None:
+        """Award criteria written inside a transaction are read back before commit."""
+        # Load the award criteria in memory first
+        self.database.select_all_award_criteria()
+        record: AwardCriteriaRecord = AwardCriteriaRecord(
+            "Honor Roll", {"cum_gpa": {"$gte": 3.0}}, 10, [["cum_gpa", -1]]
+        )
+
+        with self.database.transaction():
+            self.database.insert_award_criteria(record)
+            self.assertEqual(
+                self.database.select_award_criteria("honor roll").limit, 10
+            )
+
+            self.database.update_award_criteria(
+                self.record.name, self.record.criteria, 5, self.record.sort
+            )
+            self.assertEqual(
+                self.database.select_award_criteria(self.record.name).limit, 5
+            )
+
+            self.database.remove_award_criteria("Honor Roll")
+            self.assertEqual(
+                [award.name for award in self.database.select_all_award_criteria()],
+                [self.record.name],
+            )
+
+        self.assertEqual(self.database.select_award_criteria(self.record.name).limit, 5)
+        self.assertIsNone(self.database.select_award_criteria("Honor Roll"))
+
+
+if __name__ == "__main__":
+    unittest.main()